@@ -1,5 +1,9 @@
 from flask import Flask, request, abort
+import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from jose import jwt
 from urllib.request import urlopen
@@ -18,6 +22,47 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+class TokenCache:
+    """Bounded LRU of verified token payloads, keyed by the token's SHA-256.
+
+    Entries expire with the token's exp claim, and after max_ttl seconds at
+    the latest.
+    """
+
+    def __init__(self, maxsize=1024, max_ttl=300):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, token):
+        key = hashlib.sha256(token.encode()).digest()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            payload, expires = entry
+            if time.time() >= expires:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return payload
+
+    def set(self, token, payload):
+        expires = time.time() + self.max_ttl
+        if 'exp' in payload:
+            expires = min(expires, payload['exp'])
+        key = hashlib.sha256(token.encode()).digest()
+        with self.lock:
+            self.entries[key] = (payload, expires)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+verified_tokens = TokenCache()
+
+
 def get_token_auth_header():
     """Obtains the Access Token from the Authorization Header
     """
@@ -123,10 +168,13 @@ def requires_auth(permission=''):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            try:
-                payload = verify_decode_jwt(token)
-            except:
-                abort(401)
+            payload = verified_tokens.get(token)
+            if payload is None:
+                try:
+                    payload = verify_decode_jwt(token)
+                except:
+                    abort(401)
+                verified_tokens.set(token, payload)
             
             check_permissions(permission, payload)
 
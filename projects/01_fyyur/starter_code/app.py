@@ -2,18 +2,31 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import csv
+import io
 import json
+import time
+import click
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context, session, make_response, g, has_request_context
+from flask.cli import AppGroup
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm, func, and_, or_, case, event, DDL, table, column, literal_column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
 from datetime import datetime
+from itertools import groupby
+from functools import lru_cache, wraps
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from flask_migrate import Migrate
 from forms import *
+from cache import TaggedCache, create_backend
+from bulk import FORMATS, Progress, RowWriter, chunked, guess_format, read_rows
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -21,13 +34,112 @@ from forms import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+
+def start_pool_wait():
+  # the session asks for its bind right before checking out a connection
+  if has_request_context():
+    g.pool_wait_start = time.perf_counter()
+
+def record_pool_checkout(dbapi_connection, connection_record, connection_proxy):
+  '''Adds the time spent waiting for a pooled connection to the current request.'''
+  if has_request_context():
+    start = g.pop('pool_wait_start', None)
+    if start is not None:
+      g.pool_wait = g.get('pool_wait', 0) + time.perf_counter() - start
+    g.pool_checkouts = g.get('pool_checkouts', 0) + 1
+
+def record_pool_connect(dbapi_connection, connection_record):
+  if has_request_context():
+    g.pool_connects = g.get('pool_connects', 0) + 1
+
+class RoutingSession(SignallingSession):
+    '''
+    Reads from the 'replica' bind while serving GET requests, if one is
+    configured. Flushes stay on the primary, and so do requests with pending
+    flash messages, which follow a write and should see it.
+    '''
+
+    def get_bind(self, mapper=None, clause=None):
+        start_pool_wait()
+        if ('replica' in self.app.config['SQLALCHEMY_BINDS'] and not self._flushing
+                and has_request_context() and request.method in ('GET', 'HEAD')
+                and '_flashes' not in session):
+            return db.get_engine(self.app, bind='replica')
+        return super().get_bind(mapper, clause)
+
+class FyyurSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        if sa_url.drivername.startswith('sqlite'):
+            # sqlite files get a NullPool, which takes no queue settings,
+            # and sqlite3.connect() has no server options to pass
+            engine_opts = {key: value for key, value in engine_opts.items()
+                           if key not in ('pool_size', 'max_overflow', 'pool_timeout')}
+            engine_opts['connect_args'] = {key: value for key, value in engine_opts.get('connect_args', {}).items()
+                                           if key != 'options'}
+        engine = super().create_engine(sa_url, engine_opts)
+        event.listen(engine, 'checkout', record_pool_checkout)
+        event.listen(engine, 'connect', record_pool_connect)
+        return engine
+
+db = FyyurSQLAlchemy(app)
 migrate = Migrate(app, db)
+page_cache = TaggedCache(create_backend(app.config))
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+# Genres are normalized into Genre rows linked through these association
+# tables. Their (genre_id, owner id) primary keys serve genre lookups and
+# the owner id indexes serve loading one venue's or artist's genres.
+venue_genres = db.Table('venue_genres',
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genres_venue_id', 'venue_id'))
+
+artist_genres = db.Table('artist_genres',
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genres_artist_id', 'artist_id'))
+
+def insert_ignoring_conflicts(table):
+  '''INSERT into table that skips rows violating one of its unique constraints.'''
+  dialect = db.engine.dialect.name
+  if dialect == 'postgresql':
+    return postgresql.insert(table).on_conflict_do_nothing()
+  if dialect == 'sqlite':
+    return table.insert().prefix_with('OR IGNORE')
+  return table.insert()
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+
+    @classmethod
+    def resolve(cls, names):
+        '''
+        Genre rows for names, creating the ones that do not exist yet. Missing
+        names are inserted skipping conflicts, so a concurrent request adding
+        the same genre does not fail this one on the unique name.
+        '''
+        names = list(dict.fromkeys(names))
+        existing = {genre.name: genre for genre in cls.query.filter(cls.name.in_(names))}
+        missing = [name for name in names if name not in existing]
+        if missing:
+            db.session.execute(insert_ignoring_conflicts(cls.__table__),
+                               [{'name': name} for name in missing])
+            existing.update((genre.name, genre) for genre in cls.query.filter(cls.name.in_(missing)))
+        return [existing[name] for name in names]
+
+    def __repr__(self):
+        return f'<Genre {self.id} {self.name}>'
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
 
@@ -37,7 +149,9 @@ class Venue(db.Model):
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.String(120), nullable=False)
+    # comma separated copy of the genres, kept for the search index
+    genre_names = db.Column('genres', db.String, nullable=False)
+    genres = db.relationship('Genre', secondary=venue_genres, lazy='selectin', order_by='Genre.name')
     image_link = db.Column(db.String(500))
     website_link = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
@@ -45,6 +159,10 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String)
     shows = db.relationship('Show', backref='venue', lazy=True, cascade="all, delete")
 
+    def set_genres(self, names):
+        self.genres = Genre.resolve(names)
+        self.genre_names = ', '.join(genre.name for genre in self.genres)
+
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
@@ -56,7 +174,9 @@ class Artist(db.Model):
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.String(120), nullable=False)
+    # comma separated copy of the genres, kept for the search index
+    genre_names = db.Column('genres', db.String, nullable=False)
+    genres = db.relationship('Genre', secondary=artist_genres, lazy='selectin', order_by='Genre.name')
     image_link = db.Column(db.String(500))
     website_link = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
@@ -64,35 +184,384 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String)
     shows = db.relationship('Show', backref='artist', lazy=True, cascade="all, delete")
 
+    def set_genres(self, names):
+        self.genres = Genre.resolve(names)
+        self.genre_names = ', '.join(genre.name for genre in self.genres)
+
     def __repr__(self):
         return f'<Artist {self.id} {self.name} >'
 
 class Show(db.Model):
 
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
 
+    # Criteria splitting shows around `now`; combined with a venue_id or
+    # artist_id filter they are range scans on the indexes above.
+    @classmethod
+    def upcoming(cls, now=None):
+        return cls.start_time >= (now or datetime.now())
+
+    @classmethod
+    def past(cls, now=None):
+        return cls.start_time < (now or datetime.now())
+
     def __repr__(self):
         return f'<Show {self.id} {self.artist_id} {self.venue_id} {self.start_time}>'
 
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Venues and artists are searched across name, city, state and genres.
+# On PostgreSQL a GIN index over a 'simple' tsvector of those columns ranks
+# word matches and a pg_trgm index on name keeps partial, case-insensitive
+# name matches off sequential scans. On SQLite an external-content FTS5
+# table with the trigram tokenizer, kept in sync by triggers, does both.
+# Existing databases get these through the search index migration; tables
+# made by db.create_all() get them from the after_create hooks below.
+
+def search_document(model):
+  return func.to_tsvector(
+      literal_column("'simple'"),
+      model.name + ' ' + model.city + ' ' + model.state + ' ' + model.genre_names)
+
+def search_index_ddl(tablename):
+  fts = tablename.lower() + '_search'
+  columns = 'name, city, state, genres'
+  values = 'new.name, new.city, new.state, new.genres'
+  old_values = "'delete', old.id, old.name, old.city, old.state, old.genres"
+  postgresql = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX ix_{0}_search ON "{1}" USING GIN '
+    "(to_tsvector('simple', name || ' ' || city || ' ' || state || ' ' || genres))".format(fts, tablename),
+    'CREATE INDEX ix_{0}_name_trgm ON "{1}" USING GIN (name gin_trgm_ops)'.format(fts, tablename),
+  ]
+  sqlite = [
+    "CREATE VIRTUAL TABLE {0} USING fts5({1}, content='{2}', content_rowid='id', "
+    "tokenize='trigram')".format(fts, columns, tablename),
+    'CREATE TRIGGER {0}_ai AFTER INSERT ON "{1}" BEGIN '
+    'INSERT INTO {0}(rowid, {2}) VALUES (new.id, {3}); END'.format(fts, tablename, columns, values),
+    'CREATE TRIGGER {0}_ad AFTER DELETE ON "{1}" BEGIN '
+    'INSERT INTO {0}({0}, rowid, {2}) VALUES ({3}); END'.format(fts, tablename, columns, old_values),
+    'CREATE TRIGGER {0}_au AFTER UPDATE ON "{1}" BEGIN '
+    'INSERT INTO {0}({0}, rowid, {2}) VALUES ({3}); '
+    'INSERT INTO {0}(rowid, {2}) VALUES (new.id, {4}); END'.format(fts, tablename, columns, old_values, values),
+  ]
+  return [DDL(statement).execute_if(dialect='postgresql') for statement in postgresql] + \
+         [DDL(statement).execute_if(dialect='sqlite') for statement in sqlite]
+
+for model in (Venue, Artist):
+  for ddl in search_index_ddl(model.__tablename__):
+    event.listen(model.__table__, 'after_create', ddl)
+  event.listen(model.__table__, 'before_drop', DDL(
+      'DROP TABLE IF EXISTS {}_search'.format(model.__tablename__.lower())
+  ).execute_if(dialect='sqlite'))
+
+def search_directory(model, search_term, now=None):
+  '''
+  Venues or artists matching search_term, best matches first, each with its
+  number of upcoming shows. Matches are ranked and counted in one query
+  and only the first SEARCH_RESULTS_LIMIT of them are joined to their shows.
+  '''
+  now = now or datetime.now()
+  show_owner_id = Show.venue_id if model is Venue else Show.artist_id
+  pattern = '%{}%'.format(search_term)
+
+  # lower rank sorts first
+  dialect = db.engine.dialect.name
+  if dialect == 'postgresql':
+    document = search_document(model)
+    tsquery = func.plainto_tsquery(literal_column("'simple'"), search_term)
+    rank = -(func.ts_rank(document, tsquery) + func.similarity(model.name, search_term))
+    criterion = or_(document.op('@@')(tsquery), model.name.ilike(pattern))
+  elif dialect == 'sqlite' and len(search_term) >= 3:
+    # the trigram tokenizer matches substrings of three or more characters
+    fts = table(model.__tablename__.lower() + '_search', column('rowid'), column('rank'))
+    rank = fts.c.rank
+    criterion = literal_column(fts.name).op('MATCH')('"{}"'.format(search_term.replace('"', '""')))
+  else:
+    rank = None
+    criterion = model.name.ilike(pattern)
+
+  matches = db.session.query(
+      model.id,
+      model.name,
+      (rank if rank is not None else literal_column('0')).label('rank'),
+      func.count().over().label('total')
+  )
+  if dialect == 'sqlite' and len(search_term) >= 3:
+    matches = matches.join(fts, fts.c.rowid == model.id)
+  ordering = [model.name] if rank is None else [rank, model.name]
+  matches = matches.filter(criterion).order_by(*ordering).limit(
+      app.config['SEARCH_RESULTS_LIMIT']).subquery()
+
+  rows = db.session.query(
+      matches.c.id,
+      matches.c.name,
+      matches.c.total,
+      func.count(Show.id).label('num_upcoming_shows')
+  ).outerjoin(
+      Show, and_(show_owner_id == matches.c.id, Show.upcoming(now))
+  ).group_by(
+      matches.c.id, matches.c.name, matches.c.total, matches.c.rank
+  ).order_by(matches.c.rank, matches.c.name).all()
+
+  return {
+    "count": rows[0].total if rows else 0,
+    "data": [{
+      "id": row.id,
+      "name": row.name,
+      "num_upcoming_shows": row.num_upcoming_shows
+    } for row in rows]
+  }
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+def stream_template(template_name, **context):
+  '''Renders a template lazily so the first chunks can be sent right away.'''
+  app.update_template_context(context)
+  stream = app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(5)
+  return stream
+
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=64)
+def compiled_datetime_format(format, locale):
+  '''Babel pattern and locale for a format name or pattern, parsed once.'''
+  pattern = DATETIME_FORMATS.get(format, format)
+  return babel.dates.parse_pattern(pattern), babel.Locale.parse(locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # only strings need parsing, datetime values are formatted as they are
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  pattern, locale = compiled_datetime_format(format, locale)
+  return pattern.apply(value, locale)
+
+def format_datetimes(values, format='medium', locale='en'):
+  '''Formats a whole column of timestamps with a single pattern lookup.'''
+  pattern, locale = compiled_datetime_format(format, locale)
+  parse = dateutil.parser.parse
+  return [pattern.apply(value if isinstance(value, datetime) else parse(value), locale)
+          for value in values]
 
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.filters['datetimes'] = format_datetimes
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# Rows fetched per round trip while streaming large result sets.
+STREAM_BATCH_SIZE = 1000
+
+def with_genre(query, model, genre):
+  '''Restricts a venue or artist query to one genre, by name.'''
+  if model is Venue:
+    association, owner_id = venue_genres, venue_genres.c.venue_id
+  else:
+    association, owner_id = artist_genres, artist_genres.c.artist_id
+  return query.join(association, owner_id == model.id).join(
+      Genre, Genre.id == association.c.genre_id).filter(Genre.name == genre)
+
+def with_area(query, model, city=None, state=None):
+  if city:
+    query = query.filter(model.city == city)
+  if state:
+    query = query.filter(model.state == state)
+  return query
+
+def venue_directory(now=None, genre=None, city=None, state=None):
+  '''
+  Venues grouped by city and state, each with its number of upcoming shows,
+  optionally narrowed to one genre and area. A single aggregated query
+  returns every venue with its count already ordered by area, so the rows
+  are grouped as they stream in.
+  '''
+  now = now or datetime.now()
+  query = db.session.query(
+      Venue.id,
+      Venue.name,
+      Venue.city,
+      Venue.state,
+      func.count(Show.id).label('num_upcoming_shows')
+  )
+  if genre:
+    query = with_genre(query, Venue, genre)
+  query = with_area(query, Venue, city, state)
+  rows = query.outerjoin(
+      Show, and_(Show.venue_id == Venue.id, Show.upcoming(now))
+  ).group_by(Venue.id).order_by(
+      Venue.city, Venue.state, Venue.id
+  ).yield_per(STREAM_BATCH_SIZE)
+
+  areas = []
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    areas.append({
+      "city": city,
+      "state": state,
+      "venues": [{
+        "id": venue.id,
+        "name": venue.name,
+        "num_upcoming_shows": venue.num_upcoming_shows
+      } for venue in venues]
+    })
+  return areas
+
+def show_timeline(owner, owner_id, now=None, past_page=1, upcoming_page=1, per_page=None):
+  '''
+  Past and upcoming shows of a venue (owner='venue') or an artist
+  (owner='artist'). Every show carries the id, name and image of the other
+  side, fetched in the same joined query. Both sides are split in SQL around
+  one captured `now`; with per_page set, each side is paginated on its own.
+  '''
+  now = now or datetime.now()
+  if owner == 'venue':
+    owner_id_column, other, other_id_column = Show.venue_id, Artist, Show.artist_id
+  else:
+    owner_id_column, other, other_id_column = Show.artist_id, Venue, Show.venue_id
+  prefix = other.__name__.lower()
+
+  past_count, upcoming_count = db.session.query(
+      func.count(case([(Show.past(now), 1)])),
+      func.count(case([(Show.upcoming(now), 1)]))
+  ).filter(owner_id_column == owner_id).one()
+
+  def side(criterion, order, page):
+    query = db.session.query(
+        other_id_column.label('other_id'),
+        other.name,
+        other.image_link,
+        Show.start_time
+    ).join(other, other.id == other_id_column).filter(
+        owner_id_column == owner_id, criterion
+    ).order_by(order, Show.id)
+    if per_page:
+      query = query.limit(per_page).offset((page - 1) * per_page)
+    return [{
+      prefix + "_id": row.other_id,
+      prefix + "_name": row.name,
+      prefix + "_image_link": row.image_link,
+      "start_time": row.start_time
+    } for row in query]
+
+  return {
+    "past_shows": side(Show.past(now), Show.start_time.desc(), past_page),
+    "upcoming_shows": side(Show.upcoming(now), Show.start_time, upcoming_page),
+    "past_shows_count": past_count,
+    "upcoming_shows_count": upcoming_count,
+    "past_page": past_page,
+    "upcoming_page": upcoming_page,
+    "per_page": per_page
+  }
+
+def show_listing(after=None):
+  '''
+  Shows joined with the columns pages/shows.html needs from their venue and
+  artist, ordered by (start_time, id). `after` is a (start_time, id) keyset
+  cursor: only shows sorting after it are returned.
+  '''
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+  ).join(Venue, Venue.id == Show.venue_id).join(
+      Artist, Artist.id == Show.artist_id
+  ).order_by(Show.start_time, Show.id)
+  if after is not None:
+    start_time, show_id = after
+    query = query.filter(or_(
+        Show.start_time > start_time,
+        and_(Show.start_time == start_time, Show.id > show_id)))
+  return query
+
+def encode_cursor(show):
+  return '{}_{}'.format(show.start_time.isoformat(), show.id)
+
+def decode_cursor(cursor):
+  '''Parses an ?after= cursor, aborting with 400 when it is malformed.'''
+  try:
+    start_time, show_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+  except ValueError:
+    abort(400)
+
+def timeline_pages():
+  '''Reads the ?past_page= and ?upcoming_page= arguments of a detail page.'''
+  return {
+    "past_page": max(request.args.get('past_page', 1, type=int), 1),
+    "upcoming_page": max(request.args.get('upcoming_page', 1, type=int), 1),
+    "per_page": app.config['SHOWS_PER_PAGE']
+  }
+
+#----------------------------------------------------------------------------#
+# Caching.
+#----------------------------------------------------------------------------#
+
+# Listing and detail pages are served from page_cache until a controller
+# that changes what they show invalidates one of their tags:
+#   'venues' / 'artists' / 'shows'  the listing pages
+#   'venue:<id>' / 'artist:<id>'    a detail page
+#   'pages'                         every cached page (bulk imports)
+
+def cached_page(*tags):
+  '''
+  Serves a GET view from page_cache, keyed on its path and query string.
+  tags are filled in with the view arguments, e.g. 'venue:{venue_id}'.
+  '''
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**view_args):
+      # a page rendered with pending flash messages would cache them too
+      if '_flashes' in session:
+        return view(**view_args)
+      key = 'page:' + request.full_path
+      body = page_cache.get(key)
+      if body is not None:
+        response = Response(body, mimetype='text/html')
+        response.headers['X-Cache'] = 'HIT'
+        return response
+      page_tags = ['pages'] + [tag.format(**view_args) for tag in tags]
+      versions = page_cache.versions(page_tags)
+      response = make_response(view(**view_args))
+      if response.status_code == 200 and not response.is_streamed:
+        page_cache.set(key, response.get_data(), page_tags, versions)
+      response.headers['X-Cache'] = 'MISS'
+      return response
+    return wrapper
+  return decorator
+
+def counterpart_tags(owner, owner_id):
+  '''Tags of the artists with shows at a venue, or the venues an artist plays at.'''
+  if owner == 'venue':
+    other_id_column, owner_id_column, prefix = Show.artist_id, Show.venue_id, 'artist:'
+  else:
+    other_id_column, owner_id_column, prefix = Show.venue_id, Show.artist_id, 'venue:'
+  ids = db.session.query(other_id_column).filter(owner_id_column == owner_id).distinct()
+  return [prefix + str(other_id) for other_id, in ids]
+
+@app.route('/cache/stats')
+def cache_stats():
+  return jsonify(page_cache.stats())
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -107,71 +576,30 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cached_page('venues')
 def venues():
-  venues = Venue.query.order_by('city','state','id').all()
-  data = []
-  preCity = ""
-  preState = ""
-  indx = -1
-  for venue in venues:
-    curCity = venue.city
-    curState = venue.state
-    if (curCity != preCity or curState != preState):
-      data.append({"city": curCity, "state": curState, "venues":[]})
-      indx += 1
-    num_upcoming_shows = db.session.query(Show).filter(Show.venue_id == venue.id, str(Show.start_time) > str(datetime.now())).count()
-    data[indx]["venues"].append({"id": venue.id, "name": venue.name, "num_upcoming_shows": num_upcoming_shows})
-    preCity = curCity
-    preState = curState
-
-  return render_template('pages/venues.html', areas=data)
+  # ?genre=, ?city= and ?state= narrow the directory, e.g. /venues?genre=Jazz&state=CA
+  areas = venue_directory(genre=request.args.get('genre'),
+                          city=request.args.get('city'),
+                          state=request.args.get('state'))
+  return render_template('pages/venues.html', areas=areas)
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
   search_term = request.form.get('search_term', '')
-  search = "%{}%".format(search_term)
-  venues = Venue.query.filter(Venue.name.like(search)).all()
-  numOfResults = len(venues)
-  response={
-    "count": numOfResults,
-    "data": []
-  }
-  for i in range(numOfResults):
-    x = {}
-    x["id"] = venues[i].id
-    x["name"] = venues[i].name
-    x["num_upcoming_shows"] = 0
-    response["data"].append(x)
-
+  response = search_directory(Venue, search_term)
   return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
+@cached_page('venue:{venue_id}')
 def show_venue(venue_id):
 
-  venue = Venue.query.get(venue_id)
+  venue = Venue.query.get_or_404(venue_id)
 
-  list_shows = db.session.query(Show).filter(Show.venue_id == venue_id)
-  past_shows = []
-  upcoming_shows = []
-  for show in list_shows:
-    artist = db.session.query(Artist.name, Artist.image_link).filter(Artist.id == show.artist_id).one()
-    
-    show_add = {
-        "artist_id": show.artist_id,
-        "artist_name": artist.name,
-        "artist_image_link": artist.image_link,
-        "start_time": str(show.start_time)
-    }
-
-    if (str(show.start_time) < str(datetime.now())):
-        past_shows.append(show_add)
-    else:
-        upcoming_shows.append(show_add)
-  
   data={
     "id": venue.id,
     "name": venue.name,
-    "genres": [venue.genres],
+    "genres": [genre.name for genre in venue.genres],
     "address": venue.address,
     "city": venue.city,
     "state": venue.state,
@@ -181,11 +609,8 @@ def show_venue(venue_id):
     "seeking_talent": venue.seeking_talent,
     "seeking_description": venue.seeking_description,
     "image_link": venue.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows),
   }
+  data.update(show_timeline('venue', venue_id, **timeline_pages()))
   return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -207,16 +632,17 @@ def create_venue_submission():
           state=form.state.data,
           address=form.address.data,
           phone=form.phone.data,
-          genres=form.genres.data,
           facebook_link=form.facebook_link.data,
           image_link=form.image_link.data,
           website_link=form.website_link.data,
           seeking_talent=form.seeking_talent.data,
           seeking_description=form.seeking_description.data
       )
+      venue.set_genres(form.genres.data)
       # modify data to be the data object returned from db insertion
       db.session.add(venue)
       db.session.commit()
+      page_cache.invalidate('venues')
       # on successful db insert, flash success
       flash('Venue ' + form.name.data + ' was successfully listed!')
   except ValueError as e:
@@ -237,8 +663,10 @@ def delete_venue(venue_id):
   try:
     venue = Venue.query.get(venue_id)
     name = venue.name
+    tags = counterpart_tags('venue', venue.id)
     db.session.delete(venue)
     db.session.commit()
+    page_cache.invalidate('venues', 'shows', 'venue:%s' % venue_id, *tags)
     body['name']= venue.name
     body['id'] = venue.id
     flash('Venue ' + name + ' was successfully deleted!')
@@ -256,8 +684,15 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cached_page('artists')
 def artists():
-  artists = Artist.query.order_by('id').all()
+  # ?genre=, ?city= and ?state= narrow the list, e.g. /artists?genre=Jazz&state=CA
+  query = db.session.query(Artist.id, Artist.name)
+  genre = request.args.get('genre')
+  if genre:
+    query = with_genre(query, Artist, genre)
+  query = with_area(query, Artist, request.args.get('city'), request.args.get('state'))
+  artists = query.order_by(Artist.id).all()
   data = []
   for artist in artists:
     x = {}
@@ -275,8 +710,10 @@ def delete_artist(artist_id):
   try:
     artist = Artist.query.get(artist_id)
     name = artist.name
+    tags = counterpart_tags('artist', artist.id)
     db.session.delete(artist)
     db.session.commit()
+    page_cache.invalidate('artists', 'venues', 'shows', 'artist:%s' % artist_id, *tags)
     body['name']= artist.name
     body['id'] = artist.id
     flash('Artist ' + name + ' was successfully deleted!')
@@ -294,49 +731,19 @@ def delete_artist(artist_id):
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
   search_term = request.form.get('search_term', '')
-  search = "%{}%".format(search_term)
-  artists = Artist.query.filter(Artist.name.like(search)).all()
-  numOfResults = len(artists)
-  response={
-    "count": numOfResults,
-    "data": []
-  }
-  for i in range(numOfResults):
-    x = {}
-    x["id"] = artists[i].id
-    x["name"] = artists[i].name
-    x["num_upcoming_shows"] = 0
-    response["data"].append(x)
-
+  response = search_directory(Artist, search_term)
   return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@cached_page('artist:{artist_id}')
 def show_artist(artist_id):
 
-  artist = Artist.query.get(artist_id)
-
-  list_shows = db.session.query(Show).filter(Show.artist_id == artist_id)
-  past_shows = []
-  upcoming_shows = []
-  for show in list_shows:
-    venue = db.session.query(Venue.name, Venue.image_link).filter(Venue.id == show.venue_id).one()
-    
-    show_add = {
-        "venue_id": show.venue_id,
-        "venue_name": venue.name,
-        "venue_image_link": venue.image_link,
-        "start_time": str(show.start_time)
-    }
-
-    if (str(show.start_time) < str(datetime.now())):
-        past_shows.append(show_add)
-    else:
-        upcoming_shows.append(show_add)
+  artist = Artist.query.get_or_404(artist_id)
 
   data={
     "id": artist.id,
     "name": artist.name,
-    "genres": [artist.genres],
+    "genres": [genre.name for genre in artist.genres],
     "city": artist.city,
     "state": artist.state,
     "phone": artist.phone,
@@ -345,11 +752,8 @@ def show_artist(artist_id):
     "seeking_venue": artist.seeking_venue,
     "seeking_description": artist.seeking_description,
     "image_link": artist.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows),
   }
+  data.update(show_timeline('artist', artist_id, **timeline_pages()))
   return render_template('pages/show_artist.html', artist=data)
 
 #  Update
@@ -361,7 +765,7 @@ def edit_artist(artist_id):
   data={
     "id": artist.id,
     "name": artist.name,
-    "genres": [artist.genres],
+    "genres": [genre.name for genre in artist.genres],
     "city": artist.city,
     "state": artist.state,
     "phone": artist.phone,
@@ -383,13 +787,15 @@ def edit_artist_submission(artist_id):
       artist.city = form.city.data
       artist.state = form.state.data
       artist.phone = form.phone.data
-      artist.genres = form.genres.data
+      artist.set_genres(form.genres.data)
       artist.facebook_link = form.facebook_link.data
       artist.image_link = form.image_link.data
       artist.website_link = form.website_link.data
       artist.seeking_venue = form.seeking_venue.data
       artist.seeking_description = form.seeking_description.data
       db.session.commit()
+      page_cache.invalidate('artists', 'shows', 'artist:%s' % artist_id,
+                            *counterpart_tags('artist', artist_id))
       flash('Artist ' + artist.name + ' was successfully edited!')
   except ValueError:
       db.session.rollback()
@@ -406,7 +812,7 @@ def edit_venue(venue_id):
   data={
     "id": venue.id,
     "name": venue.name,
-    "genres": [venue.genres],
+    "genres": [genre.name for genre in venue.genres],
     "city": venue.city,
     "state": venue.state,
     "address": venue.address,
@@ -429,13 +835,15 @@ def edit_venue_submission(venue_id):
       venue.state = form.state.data
       venue.address = form.address.data
       venue.phone = form.phone.data
-      venue.genres = form.genres.data
+      venue.set_genres(form.genres.data)
       venue.facebook_link = form.facebook_link.data
       venue.image_link = form.image_link.data
       venue.website_link = form.website_link.data
       venue.seeking_talent = form.seeking_talent.data
       venue.seeking_description = form.seeking_description.data
       db.session.commit()
+      page_cache.invalidate('venues', 'shows', 'venue:%s' % venue_id,
+                            *counterpart_tags('venue', venue_id))
       flash('Venue ' + venue.name + ' was successfully edited!')
   except ValueError:
       db.session.rollback()
@@ -463,16 +871,17 @@ def create_artist_submission():
           city=form.city.data,
           state=form.state.data,
           phone=form.phone.data,
-          genres=form.genres.data,
           facebook_link=form.facebook_link.data,
           image_link=form.image_link.data,
           website_link=form.website_link.data,
           seeking_venue=form.seeking_venue.data,
           seeking_description=form.seeking_description.data
       )
+      artist.set_genres(form.genres.data)
       # modify data to be the data object returned from db insertion
       db.session.add(artist)
       db.session.commit()
+      page_cache.invalidate('artists')
       # on successful db insert, flash success
       flash('Artist ' + form.name.data + ' was successfully listed!')
   except ValueError as e:
@@ -489,21 +898,32 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@cached_page('shows')
 def shows():
-  shows = Show.query.order_by('id').all()
-  data = []
-  for show in shows:
-    x = {}
-    artist = Artist.query.get(show.artist_id)
-    x["venue_id"] = show.venue_id
-    x["venue_name"] = Venue.query.get(show.venue_id).name
-    x["artist_id"] = show.artist_id
-    x["artist_name"] = artist.name
-    x["artist_image_link"] = artist.image_link
-    x["start_time"] = show.start_time
-    data.append(x)
+  after = request.args.get('after')
+  listing = show_listing(decode_cursor(after) if after else None)
+
+  def show_data(show):
+    return {
+      "venue_id": show.venue_id,
+      "venue_name": show.venue_name,
+      "artist_id": show.artist_id,
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": show.start_time
+    }
+
+  # ?stream=true renders every remaining show while rows are still arriving
+  if request.args.get('stream') == 'true':
+    data = (show_data(show) for show in listing.yield_per(STREAM_BATCH_SIZE))
+    return Response(stream_with_context(stream_template('pages/shows.html', shows=data)))
 
-  return render_template('pages/shows.html', shows=data)
+  per_page = app.config['SHOWS_PER_PAGE']
+  rows = listing.limit(per_page + 1).all()
+  next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+  return render_template('pages/shows.html',
+                         shows=[show_data(show) for show in rows[:per_page]],
+                         next_cursor=next_cursor)
 
 @app.route('/shows/create')
 def create_shows():
@@ -525,6 +945,8 @@ def create_show_submission():
       # modify data to be the data object returned from db insertion
       db.session.add(show)
       db.session.commit()
+      page_cache.invalidate('venues', 'shows', 'venue:%s' % show.venue_id,
+                            'artist:%s' % show.artist_id)
       # on successful db insert, flash success
       flash('Show was successfully listed!')
   except ValueError as e:
@@ -536,6 +958,14 @@ def create_show_submission():
       db.session.close()
   return render_template('pages/home.html')
 
+@app.after_request
+def add_pool_timing(response):
+  # Server-Timing shows up in the browser's network panel and load tests
+  if 'pool_checkouts' in g:
+    response.headers.add('Server-Timing', 'db-pool;dur=%.2f;desc="%d checkouts, %d connects"' % (
+        g.get('pool_wait', 0) * 1000, g.pool_checkouts, g.get('pool_connects', 0)))
+  return response
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -555,6 +985,182 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# Bulk loading.
+#----------------------------------------------------------------------------#
+
+# `flask fyyur import KIND FILE` and `flask fyyur export KIND FILE` move
+# venues, artists or shows through CSV or NDJSON files one chunk at a time.
+# Imported rows pass the same form validation as the create pages, go in
+# with bulk_insert_mappings (COPY for shows on PostgreSQL) and are committed
+# once per chunk. Genres are a comma separated list of names.
+
+BULK_FIELDS = {
+  'venues': ['id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+             'website_link', 'facebook_link', 'seeking_talent', 'seeking_description'],
+  'artists': ['id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+              'website_link', 'facebook_link', 'seeking_venue', 'seeking_description'],
+  'shows': ['id', 'artist_id', 'venue_id', 'start_time'],
+}
+
+# kind: (model, form, genre association table, owner column in that table)
+BULK_MODELS = {
+  'venues': (Venue, VenueForm, venue_genres, 'venue_id'),
+  'artists': (Artist, ArtistForm, artist_genres, 'artist_id'),
+  'shows': (Show, ShowForm, None, None),
+}
+
+fyyur_cli = AppGroup('fyyur', help='Bulk import and export of venues, artists and shows.')
+app.cli.add_command(fyyur_cli)
+
+def bulk_formdata(row):
+  '''Form data for an imported row; genres may be a list or a comma separated string.'''
+  data = MultiDict()
+  for key, value in row.items():
+    if value is None or value == '' or key == 'id':
+      continue
+    if key == 'genres':
+      for name in value if isinstance(value, list) else value.split(','):
+        data.add(key, name.strip())
+    elif key in ('seeking_talent', 'seeking_venue'):
+      if str(value).lower() in ('true', 'y', '1'):
+        data.add(key, 'y')
+    else:
+      data.add(key, str(value))
+  return data
+
+def bulk_mapping(kind, row):
+  '''Validates row with the form for kind, returning (mapping, errors).'''
+  form = BULK_MODELS[kind][1](bulk_formdata(row), meta={'csrf': False})
+  if not form.validate():
+    return None, form.errors
+  mapping = form.data
+  try:
+    if row.get('id') not in (None, ''):
+      mapping['id'] = int(row['id'])
+    if kind == 'shows':
+      mapping['artist_id'] = int(mapping['artist_id'])
+      mapping['venue_id'] = int(mapping['venue_id'])
+  except (TypeError, ValueError):
+    return None, 'ids must be integers'
+  return mapping, None
+
+def resolve_genre_ids(names, genre_ids):
+  '''Ids for genre names, inserting unknown genres; genre_ids caches name -> id.'''
+  for name in names:
+    if name not in genre_ids:
+      genre_ids[name] = db.session.execute(
+          Genre.__table__.insert().values(name=name)).inserted_primary_key[0]
+  return [genre_ids[name] for name in names]
+
+def copy_rows(table, rows):
+  '''Streams rows into table with PostgreSQL's COPY, inside the session's transaction.'''
+  columns = list(rows[0])
+  buffer = io.StringIO()
+  csv.writer(buffer).writerows([row[column] for column in columns] for row in rows)
+  buffer.seek(0)
+  cursor = db.session.connection().connection.cursor()
+  cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+      table.name, ', '.join(columns)), buffer)
+
+def import_chunk(kind, chunk, genre_ids, progress):
+  model, _, association, owner_key = BULK_MODELS[kind]
+
+  def reject(line_num, errors):
+    progress.rejected += 1
+    click.echo('line {}: {}'.format(line_num, errors), err=True)
+
+  valid = []
+  for line_num, row in chunk:
+    mapping, errors = bulk_mapping(kind, row) if row is not None else (None, 'malformed row')
+    if errors:
+      reject(line_num, errors)
+    else:
+      valid.append((line_num, mapping))
+
+  if kind == 'shows' and valid:
+    # one lookup per chunk instead of letting a single bad id fail the insert
+    artist_ids = {id for id, in Artist.query.with_entities(Artist.id).filter(
+        Artist.id.in_({mapping['artist_id'] for _, mapping in valid}))}
+    venue_ids = {id for id, in Venue.query.with_entities(Venue.id).filter(
+        Venue.id.in_({mapping['venue_id'] for _, mapping in valid}))}
+    checked = []
+    for line_num, mapping in valid:
+      if mapping['artist_id'] not in artist_ids or mapping['venue_id'] not in venue_ids:
+        reject(line_num, 'unknown artist or venue')
+      else:
+        checked.append((line_num, mapping))
+    valid = checked
+  if not valid:
+    return
+
+  rows = [mapping for _, mapping in valid]
+  genres = [list(dict.fromkeys(row.pop('genres', None) or [])) for row in rows]
+  if association is not None:
+    for row, names in zip(rows, genres):
+      row['genre_names'] = ', '.join(names)
+  try:
+    same_columns = len({tuple(row) for row in rows}) == 1
+    if kind == 'shows' and same_columns and db.engine.dialect.name == 'postgresql':
+      copy_rows(model.__table__, rows)
+    else:
+      # ids are only read back when some rows need generated ones
+      db.session.bulk_insert_mappings(model, rows,
+                                      return_defaults=any('id' not in row for row in rows))
+    if association is not None:
+      links = [{owner_key: row['id'], 'genre_id': genre_id}
+               for row, names in zip(rows, genres)
+               for genre_id in resolve_genre_ids(names, genre_ids)]
+      if links:
+        db.session.execute(association.insert(), links)
+    db.session.commit()
+    progress.done += len(rows)
+  except SQLAlchemyError as e:
+    db.session.rollback()
+    # genres inserted by this chunk were rolled back with it
+    genre_ids.clear()
+    genre_ids.update(db.session.query(Genre.name, Genre.id))
+    progress.rejected += len(rows)
+    click.echo('lines {}-{}: {}'.format(valid[0][0], valid[-1][0], getattr(e, 'orig', e)), err=True)
+
+def sync_id_sequence(model):
+  '''Moves a PostgreSQL id sequence past ids that were imported explicitly.'''
+  if db.engine.dialect.name == 'postgresql':
+    db.session.query(func.setval(func.pg_get_serial_sequence('"%s"' % model.__tablename__, 'id'),
+                                 func.coalesce(func.max(model.id), 1))).scalar()
+    db.session.commit()
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(BULK_FIELDS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per insert and commit.')
+def import_rows(kind, source, format, chunk_size):
+  '''Loads KIND from SOURCE, a CSV or NDJSON file (- for stdin).'''
+  progress = Progress('imported ' + kind)
+  genre_ids = dict(db.session.query(Genre.name, Genre.id))
+  for chunk in chunked(read_rows(source, format or guess_format(source.name)), chunk_size):
+    import_chunk(kind, chunk, genre_ids, progress)
+    click.echo(progress, err=True)
+  sync_id_sequence(BULK_MODELS[kind][0])
+  page_cache.invalidate('pages')
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(BULK_FIELDS)))
+@click.argument('target', type=click.File('w'))
+@click.option('--format', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+def export_rows(kind, target, format):
+  '''Writes every KIND row to TARGET as CSV or NDJSON (- for stdout).'''
+  model = BULK_MODELS[kind][0]
+  fields = BULK_FIELDS[kind]
+  columns = [model.genre_names if field == 'genres' else getattr(model, field) for field in fields]
+  writer = RowWriter(target, format or guess_format(target.name), fields)
+  progress = Progress('exported ' + kind)
+  for row in db.session.query(*columns).order_by(model.id).yield_per(STREAM_BATCH_SIZE):
+    writer.write(dict(zip(fields, row)))
+    progress.done += 1
+  click.echo(progress, err=True)
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
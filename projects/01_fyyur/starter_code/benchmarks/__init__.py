@@ -0,0 +1,121 @@
+'''
+Shared helpers for the fyyur benchmarks.
+
+Run a benchmark from the starter_code folder, e.g.
+
+  python -m benchmarks.bench_venues
+
+By default every benchmark seeds a throwaway sqlite file. Set
+BENCH_DATABASE_URL to run against postgres instead; the tables in that
+database are dropped and recreated, so never point it at real data.
+'''
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import app, db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+
+AREAS = [
+  ('San Francisco', 'CA'),
+  ('Los Angeles', 'CA'),
+  ('New York', 'NY'),
+  ('Austin', 'TX'),
+  ('Seattle', 'WA'),
+  ('Chicago', 'IL'),
+  ('Nashville', 'TN'),
+  ('New Orleans', 'LA'),
+]
+
+GENRES = ['Jazz', 'Blues', 'Classical', 'Folk', 'Rock n Roll', 'Hip-Hop', 'Soul']
+
+
+def setup_database():
+  '''Points the app at the benchmark database and recreates the schema.'''
+  url = os.environ.get('BENCH_DATABASE_URL')
+  if url is None:
+    url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'fyyur_bench.db')
+  app.config['SQLALCHEMY_DATABASE_URI'] = url
+  db.drop_all()
+  db.create_all()
+  return url
+
+
+def seed(num_venues, num_artists=100, shows_per_venue=4, batch_size=10000):
+  '''Bulk inserts venues, artists and shows spread around the current date.'''
+  rng = random.Random(num_venues)
+  now = datetime.now()
+
+  def insert(model, rows):
+    for start in range(0, len(rows), batch_size):
+      db.session.bulk_insert_mappings(model, rows[start:start + batch_size])
+    db.session.commit()
+
+  insert(Genre, [{"id": i + 1, "name": name} for i, name in enumerate(GENRES)])
+  insert(Artist, [{
+    "id": i,
+    "name": 'Artist %d' % i,
+    "city": rng.choice(AREAS)[0],
+    "state": rng.choice(AREAS)[1],
+    "phone": '555-000-0000',
+    "genre_names": GENRES[i % len(GENRES)],
+    "seeking_venue": False
+  } for i in range(1, num_artists + 1)])
+
+  venues = []
+  for i in range(1, num_venues + 1):
+    city, state = rng.choice(AREAS)
+    venues.append({
+      "id": i,
+      "name": 'Venue %d' % i,
+      "city": city,
+      "state": state,
+      "address": '%d Main St' % i,
+      "phone": '555-000-0000',
+      "genre_names": GENRES[i % len(GENRES)],
+      "seeking_talent": False
+    })
+  insert(Venue, venues)
+  for association, owner_id, count in ((artist_genres, 'artist_id', num_artists),
+                                       (venue_genres, 'venue_id', num_venues)):
+    db.session.execute(association.insert(), [
+      {owner_id: i, "genre_id": i % len(GENRES) + 1} for i in range(1, count + 1)])
+  db.session.commit()
+
+  insert(Show, [{
+    "venue_id": venue_id,
+    "artist_id": rng.randint(1, num_artists),
+    "start_time": now + timedelta(days=rng.randint(-365, 365), minutes=rng.randint(0, 1439))
+  } for venue_id in range(1, num_venues + 1) for _ in range(shows_per_venue)])
+
+
+@contextmanager
+def count_queries():
+  '''Counts the SQL statements executed inside the block.'''
+  counter = {'queries': 0}
+
+  def before_cursor_execute(*args):
+    counter['queries'] += 1
+
+  event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+  try:
+    yield counter
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def measure(fn, repeat=3):
+  '''Returns (best wall time in ms, statements per call) for fn().'''
+  best = None
+  with count_queries() as counter:
+    for _ in range(repeat):
+      start = time.perf_counter()
+      fn()
+      elapsed = (time.perf_counter() - start) * 1000
+      best = elapsed if best is None else min(best, elapsed)
+      db.session.remove()
+  return best, counter['queries'] // repeat
@@ -0,0 +1,49 @@
+'''
+Micro-benchmark of the datetime template filter.
+
+  python -m benchmarks.bench_datetime_filter [timestamps]
+
+"reparse" is the old filter, which parsed every value with dateutil and
+let babel resolve the locale and pattern on each call.
+'''
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel
+import dateutil.parser
+
+from app import format_datetime, format_datetimes
+
+
+def reparse_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main(count):
+  start = datetime(2020, 1, 1, 18, 30)
+  values = [start + timedelta(hours=i) for i in range(count)]
+  strings = [str(value) for value in values]
+  expected = [reparse_format_datetime(value, 'full') for value in strings]
+  assert [format_datetime(value, 'full') for value in values] == expected
+  assert format_datetimes(values, 'full') == expected
+
+  cases = [
+    ('reparse (str)', lambda: [reparse_format_datetime(value, 'full') for value in strings]),
+    ('filter (str)', lambda: [format_datetime(value, 'full') for value in strings]),
+    ('filter (datetime)', lambda: [format_datetime(value, 'full') for value in values]),
+    ('batch (datetime)', lambda: format_datetimes(values, 'full')),
+  ]
+  print('%-18s  %10s  %12s' % ('strategy', 'best ms', 'us / value'))
+  for name, fn in cases:
+    best = min(timeit.repeat(fn, number=1, repeat=5)) * 1000
+    print('%-18s  %10.1f  %12.2f' % (name, best, best * 1000 / count))
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,40 @@
+'''
+Venue search latency on a seeded dataset (100k venues by default).
+
+  python -m benchmarks.bench_search [venue count]
+
+"like" replays the old controller, a name LIKE '%term%' scan over every
+row; "indexed" is search_directory(), which also ranks the matches and
+counts upcoming shows in the same query.
+'''
+import sys
+
+from app import app, db, Venue, search_directory
+from benchmarks import setup_database, seed, measure
+
+TERMS = ['Venue 4242', 'venue 77', 'Jazz', 'San Francisco', 'zzz']
+
+
+def like_search(search_term):
+  venues = Venue.query.filter(Venue.name.like('%{}%'.format(search_term))).all()
+  return {
+    "count": len(venues),
+    "data": [{"id": venue.id, "name": venue.name, "num_upcoming_shows": 0} for venue in venues]
+  }
+
+
+def main(size):
+  with app.app_context():
+    print('seeding %d venues into %s' % (size, setup_database()))
+    seed(size, shows_per_venue=1)
+    print('%-15s  %-8s  %8s  %10s' % ('term', 'strategy', 'matches', 'best ms'))
+    for term in TERMS:
+      for name, fn in (('like', like_search), ('indexed', search_directory)):
+        args = (term,) if fn is like_search else (Venue, term)
+        matches = fn(*args)["count"]
+        best, _ = measure(lambda: fn(*args))
+        print('%-15s  %-8s  %8d  %10.1f' % (term, name, matches, best))
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
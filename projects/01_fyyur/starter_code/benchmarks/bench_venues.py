@@ -0,0 +1,45 @@
+'''
+Query count and latency of the /venues directory as the venue count grows.
+
+  python -m benchmarks.bench_venues [venue counts...]
+
+"per-venue" replays the old controller, which ran one Show count per venue;
+"aggregated" is venue_directory(), a single grouped query.
+'''
+import sys
+from datetime import datetime
+
+from app import app, db, Venue, Show, venue_directory
+from benchmarks import setup_database, seed, measure
+
+
+def per_venue_directory():
+  now = datetime.now()
+  data = []
+  for venue in Venue.query.order_by('city', 'state', 'id').all():
+    if not data or (data[-1]["city"], data[-1]["state"]) != (venue.city, venue.state):
+      data.append({"city": venue.city, "state": venue.state, "venues": []})
+    num_upcoming_shows = Show.query.filter(
+        Show.venue_id == venue.id, Show.upcoming(now)).count()
+    data[-1]["venues"].append({
+      "id": venue.id,
+      "name": venue.name,
+      "num_upcoming_shows": num_upcoming_shows
+    })
+  return data
+
+
+def main(sizes):
+  print('%8s  %-10s  %8s  %10s' % ('venues', 'strategy', 'queries', 'best ms'))
+  with app.app_context():
+    for size in sizes:
+      setup_database()
+      seed(size)
+      assert per_venue_directory() == venue_directory()
+      for name, fn in (('per-venue', per_venue_directory), ('aggregated', venue_directory)):
+        best, queries = measure(fn)
+        print('%8d  %-10s  %8d  %10.1f' % (size, name, queries, best))
+
+
+if __name__ == '__main__':
+  main([int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000])
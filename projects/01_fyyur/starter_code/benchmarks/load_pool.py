@@ -0,0 +1,87 @@
+'''
+Throughput under different connection pool settings.
+
+  BENCH_DATABASE_URL=postgresql://... python -m benchmarks.load_pool [requests] [concurrency]
+
+For every setting in SETTINGS the app is started in its own process with
+the matching DB_* environment variables and the page cache turned off, then
+venue, artist and show pages are requested from `concurrency` threads. The
+mean pool wait comes from the Server-Timing header the app adds.
+
+Pool settings only apply to PostgreSQL; on the default sqlite database every
+setting behaves the same.
+'''
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+from benchmarks import setup_database, seed
+
+PORT = 5077
+
+# (DB_POOL_SIZE, DB_MAX_OVERFLOW)
+SETTINGS = [(1, 0), (2, 2), (5, 10), (20, 10)]
+
+SERVER = 'from app import app; app.run(port=%d, threaded=True)' % PORT
+
+POOL_TIMING = re.compile(r'db-pool;dur=([\d.]+)')
+
+
+def start_server(url, pool_size, max_overflow):
+  env = dict(os.environ,
+             DATABASE_URL=url,
+             DB_POOL_SIZE=str(pool_size),
+             DB_MAX_OVERFLOW=str(max_overflow),
+             CACHE_TYPE='null')
+  server = subprocess.Popen([sys.executable, '-c', SERVER], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  for _ in range(100):
+    try:
+      urllib.request.urlopen('http://127.0.0.1:%d/' % PORT)
+      return server
+    except urllib.error.URLError:
+      time.sleep(0.1)
+  server.kill()
+  raise RuntimeError('app did not start')
+
+
+def fetch(path):
+  with urllib.request.urlopen('http://127.0.0.1:%d%s' % (PORT, path)) as response:
+    response.read()
+    match = POOL_TIMING.search(response.headers.get('Server-Timing', ''))
+    return float(match.group(1)) if match else 0.0
+
+
+def main(requests, concurrency):
+  with app.app_context():
+    url = setup_database()
+    seed(1000, num_artists=200)
+  paths = ['/venues', '/shows'] + ['/venues/%d' % (i % 1000 + 1) for i in range(0, 1000, 7)] \
+      + ['/artists/%d' % (i % 200 + 1) for i in range(0, 200, 3)]
+  work = [paths[i % len(paths)] for i in range(requests)]
+
+  print('concurrency %d, %d requests' % (concurrency, requests))
+  print('%9s  %12s  %10s  %14s' % ('pool_size', 'max_overflow', 'req / s', 'pool wait ms'))
+  for pool_size, max_overflow in SETTINGS:
+    server = start_server(url, pool_size, max_overflow)
+    try:
+      with ThreadPoolExecutor(concurrency) as executor:
+        start = time.perf_counter()
+        waits = list(executor.map(fetch, work))
+        elapsed = time.perf_counter() - start
+    finally:
+      server.terminate()
+      server.wait()
+    print('%9d  %12d  %10.0f  %14.2f' % (
+        pool_size, max_overflow, requests / elapsed, sum(waits) / len(waits)))
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+       int(sys.argv[2]) if len(sys.argv) > 2 else 32)
@@ -0,0 +1,89 @@
+'''
+Streaming readers and writers for bulk loading fyyur data.
+
+Rows are read and written one at a time, so files of any size are handled
+in bounded memory; callers group them into batches with chunked().
+'''
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+FORMATS = ('csv', 'ndjson')
+
+# the format ShowForm's DateTimeField parses
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def guess_format(filename):
+  if filename.endswith(('.ndjson', '.jsonl')):
+    return 'ndjson'
+  return 'csv'
+
+
+def read_rows(stream, format):
+  '''
+  Yields (line number, row dict) for every row of a CSV or NDJSON stream.
+  A malformed NDJSON line is yielded as (line number, None).
+  '''
+  if format == 'csv':
+    reader = csv.DictReader(stream)
+    for row in reader:
+      yield reader.line_num, row
+    return
+  for line_num, line in enumerate(stream, 1):
+    if not line.strip():
+      continue
+    try:
+      row = json.loads(line)
+    except ValueError:
+      row = None
+    yield line_num, row if isinstance(row, dict) else None
+
+
+def chunked(iterable, size):
+  iterator = iter(iterable)
+  while True:
+    chunk = list(islice(iterator, size))
+    if not chunk:
+      return
+    yield chunk
+
+
+class RowWriter:
+  '''Writes row dicts with the given fields as CSV or NDJSON.'''
+
+  def __init__(self, stream, format, fields):
+    self.stream = stream
+    self.fields = fields
+    self.csv = None
+    if format == 'csv':
+      self.csv = csv.DictWriter(stream, fieldnames=fields)
+      self.csv.writeheader()
+
+  def write(self, row):
+    row = {key: value.strftime(DATETIME_FORMAT) if isinstance(value, datetime) else value
+           for key, value in row.items()}
+    if self.csv:
+      self.csv.writerow(row)
+    else:
+      self.stream.write(json.dumps(row) + '\n')
+
+
+class Progress:
+  '''Counts processed and rejected rows and reports the rows per second.'''
+
+  def __init__(self, label):
+    self.label = label
+    self.started = time.perf_counter()
+    self.done = 0
+    self.rejected = 0
+
+  @property
+  def rate(self):
+    return self.done / max(time.perf_counter() - self.started, 1e-9)
+
+  def __str__(self):
+    return '{}: {} rows, {} rejected, {:.0f} rows/s'.format(
+        self.label, self.done, self.rejected, self.rate)
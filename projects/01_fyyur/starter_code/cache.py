@@ -0,0 +1,176 @@
+'''
+Tagged page and fragment cache.
+
+Entries are stored with the versions of the tags they depend on, e.g.
+'venue:3'. Invalidating a tag bumps its version, so every entry rendered
+from the old data stops matching without having to find and delete it.
+
+The default backend is an in-process LRU with a TTL; set CACHE_TYPE to
+'redis' to share entries between workers through a Redis-compatible
+server, or to 'null' to turn caching off.
+'''
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+try:
+  import redis
+except ImportError:
+  redis = None
+
+
+class NullBackend:
+  '''Stores nothing; every lookup misses.'''
+
+  name = 'null'
+
+  def get(self, key):
+    return None
+
+  def set(self, key, value):
+    pass
+
+  def incr(self, key):
+    pass
+
+  def counters(self, keys):
+    return [0] * len(keys)
+
+  def size(self):
+    return 0
+
+
+class LRUBackend:
+  '''
+  Keeps up to maxsize entries for ttl seconds in this process, evicting the
+  least recently used one when full. Tag counters are kept apart from the
+  entries and never evicted, so a stale entry can not become valid again.
+  '''
+
+  name = 'simple'
+
+  def __init__(self, maxsize=500, ttl=300):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.entries = OrderedDict()
+    self.tag_counters = {}
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      expires, value = entry
+      if expires < time.monotonic():
+        del self.entries[key]
+        return None
+      self.entries.move_to_end(key)
+      return value
+
+  def set(self, key, value):
+    with self.lock:
+      self.entries[key] = (time.monotonic() + self.ttl, value)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.maxsize:
+        self.entries.popitem(last=False)
+
+  def incr(self, key):
+    with self.lock:
+      self.tag_counters[key] = self.tag_counters.get(key, 0) + 1
+
+  def counters(self, keys):
+    return [self.tag_counters.get(key, 0) for key in keys]
+
+  def size(self):
+    return len(self.entries)
+
+
+class RedisBackend:
+  '''Shares entries between processes through a Redis-compatible server.'''
+
+  name = 'redis'
+
+  def __init__(self, url, ttl=300, prefix='fyyur:'):
+    if redis is None:
+      raise RuntimeError("CACHE_TYPE 'redis' needs the redis package installed")
+    self.client = redis.Redis.from_url(url)
+    self.ttl = ttl
+    self.prefix = prefix
+
+  def get(self, key):
+    value = self.client.get(self.prefix + key)
+    return None if value is None else pickle.loads(value)
+
+  def set(self, key, value):
+    self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+  def incr(self, key):
+    self.client.incr(self.prefix + 'tag:' + key)
+
+  def counters(self, keys):
+    if not keys:
+      return []
+    values = self.client.mget([self.prefix + 'tag:' + key for key in keys])
+    return [int(value or 0) for value in values]
+
+  def size(self):
+    return self.client.dbsize()
+
+
+def create_backend(config):
+  '''The backend selected by CACHE_TYPE in a Flask config.'''
+  cache_type = config.get('CACHE_TYPE', 'simple')
+  ttl = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+  if cache_type == 'null':
+    return NullBackend()
+  if cache_type == 'redis':
+    return RedisBackend(config['CACHE_REDIS_URL'], ttl=ttl)
+  return LRUBackend(maxsize=config.get('CACHE_THRESHOLD', 500), ttl=ttl)
+
+
+class TaggedCache:
+  '''Tag-versioned entries on top of a backend, counting hits and misses.'''
+
+  def __init__(self, backend):
+    self.backend = backend
+    self.hits = 0
+    self.misses = 0
+
+  def versions(self, tags):
+    '''
+    Current versions of tags. Read them before computing a value, so that
+    an invalidation racing with the computation discards the result.
+    '''
+    return self.backend.counters(list(tags))
+
+  def get(self, key):
+    entry = self.backend.get(key)
+    if entry is not None:
+      value, tags, versions = entry
+      if self.versions(tags) == versions:
+        self.hits += 1
+        return value
+    self.misses += 1
+    return None
+
+  def set(self, key, value, tags, versions=None):
+    tags = list(tags)
+    if versions is None:
+      versions = self.versions(tags)
+    self.backend.set(key, (value, tags, versions))
+
+  def invalidate(self, *tags):
+    for tag in tags:
+      self.backend.incr(tag)
+
+  def stats(self):
+    lookups = self.hits + self.misses
+    return {
+      "backend": self.backend.name,
+      "entries": self.backend.size(),
+      "hits": self.hits,
+      "misses": self.misses,
+      "hit_rate": round(self.hits / lookups, 3) if lookups else None
+    }
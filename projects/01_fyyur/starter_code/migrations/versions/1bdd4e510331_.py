@@ -0,0 +1,63 @@
+"""venue and artist search indexes
+
+Revision ID: 1bdd4e510331
+Revises: 5c3e8f2a7b19
+Create Date: 2026-10-18 01:40:12.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1bdd4e510331'
+down_revision = '5c3e8f2a7b19'
+branch_labels = None
+depends_on = None
+
+TABLES = ['Venue', 'Artist']
+COLUMNS = 'name, city, state, genres'
+VALUES = 'new.name, new.city, new.state, new.genres'
+OLD_VALUES = "'delete', old.id, old.name, old.city, old.state, old.genres"
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in TABLES:
+            fts = table.lower() + '_search'
+            op.execute(
+                'CREATE INDEX ix_{0}_search ON "{1}" USING GIN '
+                "(to_tsvector('simple', name || ' ' || city || ' ' || state || ' ' || genres))".format(fts, table))
+            op.execute('CREATE INDEX ix_{0}_name_trgm ON "{1}" USING GIN (name gin_trgm_ops)'.format(fts, table))
+    else:
+        for table in TABLES:
+            fts = table.lower() + '_search'
+            op.execute(
+                "CREATE VIRTUAL TABLE {0} USING fts5({1}, content='{2}', content_rowid='id', "
+                "tokenize='trigram')".format(fts, COLUMNS, table))
+            op.execute(
+                'CREATE TRIGGER {0}_ai AFTER INSERT ON "{1}" BEGIN '
+                'INSERT INTO {0}(rowid, {2}) VALUES (new.id, {3}); END'.format(fts, table, COLUMNS, VALUES))
+            op.execute(
+                'CREATE TRIGGER {0}_ad AFTER DELETE ON "{1}" BEGIN '
+                'INSERT INTO {0}({0}, rowid, {2}) VALUES ({3}); END'.format(fts, table, COLUMNS, OLD_VALUES))
+            op.execute(
+                'CREATE TRIGGER {0}_au AFTER UPDATE ON "{1}" BEGIN '
+                'INSERT INTO {0}({0}, rowid, {2}) VALUES ({3}); '
+                'INSERT INTO {0}(rowid, {2}) VALUES (new.id, {4}); END'.format(fts, table, COLUMNS, OLD_VALUES, VALUES))
+            op.execute("INSERT INTO {0}({0}) VALUES ('rebuild')".format(fts))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TABLES:
+            fts = table.lower() + '_search'
+            op.execute('DROP INDEX ix_{}_name_trgm'.format(fts))
+            op.execute('DROP INDEX ix_{}_search'.format(fts))
+    else:
+        for table in TABLES:
+            fts = table.lower() + '_search'
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER {}_{}'.format(fts, suffix))
+            op.execute('DROP TABLE {}'.format(fts))
@@ -0,0 +1,26 @@
+"""(owner, start_time) indexes on Show
+
+Revision ID: 1de4bfaf8a1f
+Revises: 1bdd4e510331
+Create Date: 2026-10-18 02:05:41.637052
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1de4bfaf8a1f'
+down_revision = '1bdd4e510331'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='Show')
@@ -0,0 +1,35 @@
+"""typed Show.start_time
+
+Revision ID: 5c3e8f2a7b19
+Revises: a00d132def9e
+Create Date: 2026-10-18 01:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c3e8f2a7b19'
+down_revision = 'a00d132def9e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # start_time was created as VARCHAR(20); casting is a no-op on a timestamp column
+        op.alter_column('Show', 'start_time',
+                   existing_type=sa.VARCHAR(length=20),
+                   type_=sa.DateTime(),
+                   existing_nullable=False,
+                   postgresql_using='start_time::timestamp')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('Show', 'start_time',
+                   existing_type=sa.DateTime(),
+                   type_=sa.VARCHAR(length=20),
+                   existing_nullable=False,
+                   postgresql_using="to_char(start_time, 'YYYY-MM-DD HH24:MI:SS')")
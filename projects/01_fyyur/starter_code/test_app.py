@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import event
+
+from app import app, db, Genre, Venue
+
+# FYYUR_TEST_DATABASE_URL=postgresql://... runs the tests on postgres
+# instead; the tables in that database are dropped and recreated
+database_path = os.environ.get(
+  'FYYUR_TEST_DATABASE_URL',
+  'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'fyyur_test.db'))
+
+
+class GenreTestCase(unittest.TestCase):
+    '''Genre.resolve, which venue and artist submissions use to store genres.'''
+
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_path
+        app.config['TESTING'] = True
+        self.context = app.app_context()
+        self.context.push()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def add_venue(self, genres):
+        venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                      address='1015 Folsom Street', phone='123-123-1234')
+        venue.set_genres(genres)
+        db.session.add(venue)
+        db.session.commit()
+        return venue
+
+    def test_resolve_creates_missing_genres(self):
+        db.session.add(Genre(name='Jazz'))
+        db.session.commit()
+        jazz_id = Genre.query.filter_by(name='Jazz').one().id
+
+        venue = self.add_venue(['Folk', 'Jazz', 'Folk'])
+
+        self.assertEqual([genre.name for genre in venue.genres], ['Folk', 'Jazz'])
+        self.assertEqual(venue.genres[1].id, jazz_id)
+        self.assertEqual(venue.genre_names, 'Folk, Jazz')
+        self.assertEqual(Genre.query.count(), 2)
+
+    def test_resolve_genre_committed_by_concurrent_session(self):
+        # another request commits the same new genre after this session
+        # looked its genres up, right before its first write
+        committed = []
+
+        def commit_concurrently(connection, cursor, statement, parameters, context, executemany):
+            if not committed and statement.startswith('INSERT'):
+                committed.append(True)
+                with db.engine.begin() as other:
+                    other.execute(Genre.__table__.insert().values(name='Zydeco'))
+
+        event.listen(db.engine, 'before_cursor_execute', commit_concurrently)
+        try:
+            venue = self.add_venue(['Jazz', 'Zydeco'])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', commit_concurrently)
+
+        self.assertTrue(committed)
+        self.assertEqual([genre.name for genre in venue.genres], ['Jazz', 'Zydeco'])
+        self.assertEqual(Genre.query.count(), 2)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
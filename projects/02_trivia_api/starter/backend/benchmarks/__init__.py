@@ -0,0 +1,70 @@
+'''
+Shared helpers for the trivia API benchmarks.
+
+Run a benchmark from the backend folder, e.g.
+
+    python -m benchmarks.bench_pagination
+
+By default every benchmark uses a throwaway sqlite file. Set
+BENCH_DATABASE_URL to run against postgres instead; the tables in that
+database are dropped and recreated, so never point it at real data.
+'''
+import os
+import random
+import tempfile
+import time
+
+from flaskr.app import create_app
+from models import db, Question, QuestionCount, Category
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+              'Sports']
+
+WORDS = ('river mountain painter novel planet element battle queen engine '
+         'ocean desert island poet album violin stadium league medal '
+         'empire treaty comet galaxy protein enzyme canyon glacier volcano '
+         'harbor temple castle dynasty sculptor opera ballet symphony '
+         'marathon trophy senate border capital theorem formula').split()
+
+
+def create_bench_app():
+    '''An app bound to the benchmark database, with empty tables.'''
+    url = os.environ.get('BENCH_DATABASE_URL')
+    if url is None:
+        url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'trivia.db')
+    app = create_app({'DATABASE_URL': url})
+    db.drop_all()
+    # forget applied migrations too, so benchmarks can upgrade from scratch
+    db.engine.execute('DROP TABLE IF EXISTS alembic_version')
+    db.create_all()
+    return app
+
+
+def seed(num_questions, batch_size=10000):
+    '''Bulk inserts the categories and num_questions generated questions.'''
+    rng = random.Random(num_questions)
+    db.session.bulk_insert_mappings(Category, [
+        {'id': i + 1, 'type': name} for i, name in enumerate(CATEGORIES)])
+    for start in range(0, num_questions, batch_size):
+        db.session.bulk_insert_mappings(Question, [{
+            'question': 'Which %s item%d %s?' % (
+                ' '.join(rng.sample(WORDS, 4)), i, rng.choice(WORDS)),
+            'answer': rng.choice(WORDS).title(),
+            'category': rng.randint(1, len(CATEGORIES)),
+            'difficulty': rng.randint(1, 5)
+        } for i in range(start, min(start + batch_size, num_questions))])
+    db.session.commit()
+    # bulk inserts skip the mapper events that maintain the counts
+    QuestionCount.rebuild()
+
+
+def measure(fn, repeat=5):
+    '''Best wall time of fn() in milliseconds.'''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+        db.session.remove()
+    return best
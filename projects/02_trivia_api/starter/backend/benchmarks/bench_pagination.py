@@ -0,0 +1,53 @@
+'''
+Latency of GET /questions/ as the question bank grows.
+
+    python -m benchmarks.bench_pagination [sizes...]
+
+"materialized" is the old paginate_questions(), which loaded and formatted
+every question before slicing out the page.
+'''
+import sys
+
+from flask import request
+
+from flaskr.app import QUESTIONS_PER_PAGE, paginate_questions
+from models import db, Question
+from benchmarks import create_bench_app, seed, measure
+
+
+def materialized_page(page):
+    selection = Question.query.order_by(Question.id).all()
+    start = (page - 1) * QUESTIONS_PER_PAGE
+    questions = [question.format() for question in selection]
+    return questions[start:start + QUESTIONS_PER_PAGE]
+
+
+def main(sizes):
+    print('%9s  %14s  %10s  %14s  %14s' % (
+        'questions', 'materialized', 'page 1', 'middle page', 'middle after'))
+    for size in sizes:
+        app = create_bench_app()
+        with app.app_context():
+            seed(size)
+            middle = size // QUESTIONS_PER_PAGE // 2
+            middle_id = db.session.query(Question.id).order_by(
+                Question.id).offset(
+                middle * QUESTIONS_PER_PAGE - 1).limit(1).scalar()
+
+            def page(query_string):
+                with app.test_request_context('/questions/?' + query_string):
+                    return paginate_questions(
+                        request, Question.query.order_by(Question.id))
+
+            assert page('page=%d' % (middle + 1)) == \
+                page('after=%d' % middle_id) == materialized_page(middle + 1)
+            print('%9d  %11.1f ms  %7.1f ms  %11.1f ms  %11.1f ms' % (
+                size,
+                measure(lambda: materialized_page(1), repeat=2),
+                measure(lambda: page('page=1')),
+                measure(lambda: page('page=%d' % (middle + 1))),
+                measure(lambda: page('after=%d' % middle_id))))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,59 @@
+'''
+Latency of POST /search on a generated question bank.
+
+    python -m benchmarks.bench_search [questions]
+
+The search migration is applied first, so against BENCH_DATABASE_URL on
+PostgreSQL the trigram indexes are in place; on sqlite both strategies scan.
+"materialized" is the old search, which loaded every question matching on
+the question text and sliced a page out of them in Python.
+'''
+import os
+import sys
+
+from flask import request
+from flask_migrate import upgrade
+
+from flaskr.app import QUESTIONS_PER_PAGE, paginate_questions, \
+    search_questions
+from models import Question
+from benchmarks import create_bench_app, seed, measure
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), '..', 'migrations')
+
+# a rare term, a word in about a tenth of the questions and a fragment
+TERMS = ['item4242', 'volcano', 'sym']
+
+
+def materialized_page(term):
+    selection = Question.query.order_by(Question.id).filter(
+        Question.question.ilike('%{}%'.format(term))).all()
+    questions = [question.format() for question in selection]
+    return questions[:QUESTIONS_PER_PAGE], len(questions)
+
+
+def main(size):
+    app = create_bench_app()
+    with app.app_context():
+        seed(size)
+        upgrade(directory=MIGRATIONS)
+
+        def ranked_page(term):
+            with app.test_request_context('/search'):
+                query = search_questions(term)
+                return (paginate_questions(request, query, keyset=False),
+                        query.order_by(None).count())
+
+        print('%d questions' % size)
+        print('%-10s  %8s  %14s  %10s' % (
+            'term', 'matches', 'materialized', 'ranked'))
+        for term in TERMS:
+            matches = ranked_page(term)[1]
+            print('%-10s  %8d  %11.1f ms  %7.1f ms' % (
+                term, matches,
+                measure(lambda: materialized_page(term), repeat=2),
+                measure(lambda: ranked_page(term))))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500000)
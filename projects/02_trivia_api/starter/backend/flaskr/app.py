@@ -1,38 +1,179 @@
-from models import setup_db, Question, Category
+from models import setup_db, database_path, db, Question, QuestionCount, \
+    Category, category_cache
+from ingest import FORMATS, ingest, read_rows, trivia_cli
+import io
 import os
 import sys
-from flask import Flask, request, abort, jsonify
+from flask import Flask, Response, request, abort, jsonify, json, \
+    stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import func, literal_column, or_
 import random
 
 sys.path.append('../')
 
 QUESTIONS_PER_PAGE = 10
+MAX_QUESTIONS_PER_PAGE = 100
+# the fields of Question.format(), in order; ?fields= picks a subset
+QUESTION_FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+# random picks tried before a quiz excludes the played questions in SQL
+QUIZ_PICK_ATTEMPTS = 3
+BULK_CHUNK_SIZE = 1000
+MAX_BULK_CHUNK_SIZE = 10000
+# rows fetched per round trip and written per chunk of a streamed listing
+STREAM_CHUNK_SIZE = 500
+
+
+def select_fields(request, query):
+    '''
+    Narrows a Question query to the columns named by ?fields=, all of
+    Question.format() by default, so unrequested columns are never read.
+    Returns the query and a function formatting its rows.
+    '''
+    fields = QUESTION_FIELDS
+    if request.args.get('fields'):
+        fields = tuple(dict.fromkeys(
+            field.strip() for field in request.args['fields'].split(',')))
+        if not set(fields) <= set(QUESTION_FIELDS):
+            abort(422)
+
+    query = query.with_entities(
+        *[getattr(Question, field) for field in fields])
+    return query, lambda row: dict(zip(fields, row))
+
+
+def paginate_questions(request, query, keyset=True):
+    '''
+    Formats one page of a query ordered by Question.id. The page is cut in
+    SQL, with OFFSET for ?page= or, with ?after=<id>, as the questions
+    following that id, which stays fast however deep the client pages.
+    Queries in another order pass keyset=False and only support ?page=.
+    Pages hold ?per_page= questions, at most MAX_QUESTIONS_PER_PAGE.
+    '''
+    per_page = min(max(request.args.get(
+        'per_page', QUESTIONS_PER_PAGE, type=int), 1), MAX_QUESTIONS_PER_PAGE)
+    after = request.args.get('after', type=int)
+    if keyset and after is not None:
+        query = query.filter(Question.id > after)
+    else:
+        page = max(request.args.get('page', 1, type=int), 1)
+        query = query.offset((page - 1) * per_page)
 
+    query, format_question = select_fields(request, query)
+    return [format_question(row) for row in query.limit(per_page)]
 
-def paginate_questions(request, selection):
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
 
-    questions = [question.format() for question in selection]
-    current_questions = questions[start:end]
+def stream_questions(request, query, envelope):
+    '''
+    Streams every question of a query ordered by Question.id, for listings
+    requested with ?all=true: as one JSON document shaped like a page
+    (envelope plus the questions list) or, for ?format=ndjson or an
+    application/x-ndjson Accept header, one question per line. Rows come
+    from a server-side cursor through yield_per and are written as they
+    are read, so memory stays flat however large the export. ?after=<id>
+    resumes an interrupted export.
+    '''
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(Question.id > after)
+    query, format_question = select_fields(request, query)
+    rows = query.yield_per(STREAM_CHUNK_SIZE)
+
+    def chunks():
+        chunk = []
+        for row in rows:
+            chunk.append(json.dumps(format_question(row)))
+            if len(chunk) == STREAM_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    ndjson = request.args.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best_match(
+            ['application/json', 'application/x-ndjson']) == \
+        'application/x-ndjson'
+    if ndjson:
+        def generate():
+            for chunk in chunks():
+                yield '\n'.join(chunk) + '\n'
+        mimetype = 'application/x-ndjson'
+    else:
+        def generate():
+            # the envelope, reopened to append the questions list
+            yield json.dumps(envelope)[:-1] + ', "questions": ['
+            separator = ''
+            for chunk in chunks():
+                yield separator + ', '.join(chunk)
+                separator = ', '
+            yield ']}'
+        mimetype = 'application/json'
+
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def random_question(query, previous_questions):
+    '''
+    A random question of query that is not in previous_questions, picked in
+    the database with COUNT and a random OFFSET so only one row is loaded.
+    Picks that hit an already played question are retried a few times
+    before the played ids are excluded in SQL, so the NOT IN list is only
+    sent once most of the candidates have been played.
+    '''
+    played = set(previous_questions)
+    query = query.order_by(Question.id)
+
+    total = query.count()
+    for _ in range(QUIZ_PICK_ATTEMPTS):
+        if total == 0:
+            return None
+        question = query.offset(random.randrange(total)).first()
+        if question is not None and question.id not in played:
+            return question
 
-    return current_questions
+    remaining = query.filter(Question.id.notin_(played))
+    total = remaining.count()
+    if total == 0:
+        return None
+    return remaining.offset(random.randrange(total)).first()
+
+
+def search_questions(search_term):
+    '''
+    Questions whose question or answer contains search_term, best matches
+    first. On PostgreSQL the trigram indexes of the search migration serve
+    the ILIKE filter, and matches are ranked by whole-word matches plus
+    trigram similarity; elsewhere they are listed by id.
+    '''
+    pattern = '%{}%'.format(search_term)
+    query = Question.query.filter(or_(
+        Question.question.ilike(pattern), Question.answer.ilike(pattern)))
+    if db.engine.dialect.name != 'postgresql':
+        return query.order_by(Question.id)
+
+    simple = literal_column("'simple'")
+    document = func.to_tsvector(
+        simple,
+        func.coalesce(Question.question, '') + ' ' +
+        func.coalesce(Question.answer, ''))
+    rank = func.ts_rank(document, func.plainto_tsquery(simple, search_term)) \
+        + func.coalesce(func.greatest(
+            func.similarity(Question.question, search_term),
+            func.similarity(Question.answer, search_term)), 0)
+    return query.order_by(rank.desc(), Question.id)
 
 
 def get_category_list():
-    categories = {}
-    for category in Category.query.all():
-        categories[category.id] = category.type
-    return categories
+    return category_cache.get()[0]
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    app.config.from_mapping(test_config or {})
+    setup_db(app, app.config.get('DATABASE_URL', database_path))
+    app.cli.add_command(trivia_cli)
 
     '''
   Set up CORS. Allow '*' for origins.
@@ -58,15 +199,18 @@ def create_app(test_config=None):
     @app.route('/categories')
     def retrieve_categories():
 
-        categories = get_category_list()
+        categories, etag = category_cache.get()
 
         if len(categories) == 0:
             abort(404)
 
-        return jsonify({
+        # answers 304 Not Modified when If-None-Match has the current ETag
+        response = jsonify({
             'success': True,
             'categories': categories
         })
+        response.set_etag(etag)
+        return response.make_conditional(request)
 
     '''
   Creating an endpoint to handle GET requests for questions,
@@ -83,8 +227,17 @@ def create_app(test_config=None):
     @app.route('/questions/')
     def retrieve_questions():
 
-        selection = Question.query.order_by(Question.id).all()
-        current_questions = paginate_questions(request, selection)
+        if request.args.get('all') == 'true':
+            return stream_questions(
+                request, Question.query.order_by(Question.id), {
+                    'success': True,
+                    'categories': get_category_list(),
+                    'total_questions': QuestionCount.total_for(),
+                    'current_category': None
+                })
+
+        current_questions = paginate_questions(
+            request, Question.query.order_by(Question.id))
 
         if len(current_questions) == 0:
             abort(404)
@@ -93,7 +246,7 @@ def create_app(test_config=None):
             'success': True,
             'questions': current_questions,
             'categories': get_category_list(),
-            'total_questions': len(Question.query.all()),
+            'total_questions': QuestionCount.total_for(),
             'current_category': None
         })
 
@@ -115,15 +268,15 @@ def create_app(test_config=None):
                 abort(404)
 
             question.delete()
-            selection = Question.query.order_by(Question.id).all()
-            current_questions = paginate_questions(request, selection)
+            current_questions = paginate_questions(
+                request, Question.query.order_by(Question.id))
 
             return jsonify({
                 'success': True,
                 'deleted': question_id,
                 'questions': current_questions,
                 'categories': get_category_list(),
-                'total_questions': len(Question.query.all()),
+                'total_questions': QuestionCount.total_for(),
                 'current_category': None
             })
         except BaseException:
@@ -151,7 +304,7 @@ def create_app(test_config=None):
                 question=question,
                 answer=answer,
                 difficulty=difficulty,
-                category=category)
+                category=int(category))
             newQuestion.insert()
 
             return jsonify({
@@ -162,6 +315,28 @@ def create_app(test_config=None):
         except BaseException:
             abort(422)
 
+    '''
+  Creating a POST endpoint to add questions in bulk from an NDJSON
+  (application/x-ndjson, the default) or CSV (text/csv) request body,
+  or ?format=ndjson|csv. The body is read as a stream and inserted
+  ?chunk_size= rows at a time; rejected rows are listed with their
+  line number and don't stop the rest of the upload.
+  '''
+    @app.route('/questions/bulk', methods=['POST'])
+    def add_questions_bulk():
+
+        format = request.args.get('format') or (
+            'csv' if request.mimetype == 'text/csv' else 'ndjson')
+        if format not in FORMATS:
+            abort(422)
+        chunk_size = min(max(request.args.get(
+            'chunk_size', BULK_CHUNK_SIZE, type=int), 1), MAX_BULK_CHUNK_SIZE)
+
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+        result = ingest(read_rows(stream, format), chunk_size)
+
+        return jsonify(dict(result.format(), success=True))
+
     '''
   Creating a POST endpoint to get questions based on a search term.
   It should return any questions for whom the search term
@@ -175,14 +350,14 @@ def create_app(test_config=None):
     def search_question():
         try:
             searchTerm = request.get_json()['searchTerm']
-            searched_questions = Question.query.order_by(Question.id).filter(
-                Question.question.ilike("%{}%".format(searchTerm))).all()
-            current_questions = paginate_questions(request, searched_questions)
+            searched_questions = search_questions(searchTerm)
+            current_questions = paginate_questions(
+                request, searched_questions, keyset=False)
 
             return jsonify({
                 'success': True,
                 'questions': current_questions,
-                'total_questions': len(current_questions),
+                'total_questions': searched_questions.order_by(None).count(),
                 'current_category': None
             })
 
@@ -202,13 +377,20 @@ def create_app(test_config=None):
         try:
             category_questions = Question.query.order_by(
                 Question.id).filter(
-                Question.category == str(category_id)).all()
+                Question.category == category_id)
+            if request.args.get('all') == 'true':
+                return stream_questions(request, category_questions, {
+                    'success': True,
+                    'total_questions': QuestionCount.total_for(category_id),
+                    'current_category': category_id
+                })
+
             current_questions = paginate_questions(request, category_questions)
 
             return jsonify({
                 'success': True,
                 'questions': current_questions,
-                'total_questions': len(current_questions),
+                'total_questions': QuestionCount.total_for(category_id),
                 'current_category': category_id
             })
 
@@ -234,35 +416,17 @@ def create_app(test_config=None):
                     'id' in data['quiz_category']) and
                     'previous_questions' in data):
                 category_id = data['quiz_category']['id']
-                questions_query = None
+                questions_query = Question.query
                 if(str(category_id) != "0"):
-                    questions_query = Question.query.filter_by(
-                        category=category_id
-                    ).filter(
-                        Question.id.notin_(data["previous_questions"])
-                    ).all()
-                else:
-                    questions_query = Question.query.filter(
-                        Question.id.notin_(data["previous_questions"])
-                    ).all()
-
-                length_of_available_question = len(questions_query)
-                if length_of_available_question > 0:
-                    result = {
-                        "success": True,
-                        "question": Question.format(
-                            questions_query[random.randrange(
-                                0,
-                                length_of_available_question
-                            )]
-                        )
-                    }
-                else:
-                    result = {
-                        "success": True,
-                        "question": None
-                    }
-                return jsonify(result)
+                    questions_query = questions_query.filter_by(
+                        category=int(category_id))
+
+                question = random_question(
+                    questions_query, data["previous_questions"])
+                return jsonify({
+                    "success": True,
+                    "question": question.format() if question else None
+                })
             abort(404)
         abort(422)
 
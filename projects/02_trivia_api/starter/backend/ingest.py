@@ -0,0 +1,170 @@
+'''
+Bulk question loading, shared by POST /questions/bulk and
+`flask trivia load`. Rows are read from an NDJSON or CSV stream one at a
+time and inserted a chunk at a time, one transaction per chunk. Invalid
+rows are reported and skipped without failing the rest of their chunk.
+'''
+import csv
+import io
+import json
+import time
+from collections import Counter
+from itertools import islice
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Question, Category, count_questions
+
+FORMATS = ('ndjson', 'csv')
+COLUMNS = ('question', 'answer', 'category', 'difficulty')
+# per-row errors kept for the response; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def guess_format(filename):
+    return 'csv' if filename.endswith('.csv') else 'ndjson'
+
+
+def read_rows(stream, format):
+    '''Yields (line number, row) pairs; malformed NDJSON rows are None.'''
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row
+
+
+def validate(row, category_ids):
+    '''Returns (mapping, None) for a valid row, or (None, error).'''
+    if not isinstance(row, dict):
+        return None, 'malformed row'
+    mapping = {}
+    for key in ('question', 'answer'):
+        value = row.get(key)
+        if not isinstance(value, str) or not value.strip():
+            return None, '{} is required'.format(key)
+        mapping[key] = value.strip()
+    for key in ('category', 'difficulty'):
+        try:
+            mapping[key] = int(row.get(key))
+        except (TypeError, ValueError):
+            return None, '{} must be an integer'.format(key)
+    if mapping['category'] not in category_ids:
+        return None, 'unknown category {}'.format(mapping['category'])
+    return mapping, None
+
+
+def insert_questions(mappings):
+    '''
+    Inserts validated rows in the session's transaction: COPY on
+    PostgreSQL, one executemany elsewhere. Bulk inserts skip the mapper
+    events, so the question counts are adjusted here.
+    '''
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [mapping[column] for column in COLUMNS] for mapping in mappings)
+        buffer.seek(0)
+        connection.connection.cursor().copy_expert(
+            'COPY questions ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                ', '.join(COLUMNS)), buffer)
+    else:
+        connection.execute(Question.__table__.insert(), mappings)
+    totals = Counter(mapping['category'] for mapping in mappings)
+    for category, total in totals.items():
+        count_questions(connection, category, total)
+
+
+class IngestResult:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': error})
+
+    @property
+    def rows_per_second(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (self.inserted + self.rejected) / elapsed
+
+    def format(self):
+        return {
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'rows_per_second': round(self.rows_per_second)
+        }
+
+
+def ingest(rows, chunk_size=1000, on_chunk=None):
+    '''Validates and inserts (line number, row) pairs chunk by chunk.'''
+    category_ids = {category_id for category_id, in
+                    db.session.query(Category.id)}
+    dbapi_error = db.engine.dialect.dbapi.Error
+    result = IngestResult()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return result
+        mappings, lines = [], []
+        for line, row in chunk:
+            mapping, error = validate(row, category_ids)
+            if error:
+                result.reject(line, error)
+            else:
+                mappings.append(mapping)
+                lines.append(line)
+        if mappings:
+            try:
+                insert_questions(mappings)
+                db.session.commit()
+                result.inserted += len(mappings)
+            except (SQLAlchemyError, dbapi_error) as e:
+                db.session.rollback()
+                for line in lines:
+                    result.reject(line, 'chunk failed: {}'.format(e))
+        if on_chunk:
+            on_chunk(result)
+
+
+trivia_cli = AppGroup('trivia', help='Trivia question bank tools.')
+
+
+@trivia_cli.command('load')
+@click.argument('source', type=click.File('r'))
+@click.option('--format', type=click.Choice(FORMATS),
+              help='Defaults to the file extension.')
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Rows per insert and commit.')
+def load(source, format, chunk_size):
+    '''Loads questions from SOURCE, an NDJSON or CSV file (- for stdin).'''
+    def report(result):
+        click.echo('{inserted} inserted, {rejected} rejected, '
+                   '{rows_per_second} rows/s'.format(**result.format()),
+                   err=True)
+
+    result = ingest(read_rows(source, format or guess_format(source.name)),
+                    chunk_size, on_chunk=report)
+    for error in result.errors:
+        click.echo('line {line}: {error}'.format(**error), err=True)
+    if result.rejected > len(result.errors):
+        click.echo('... {} more rejected rows'.format(
+            result.rejected - len(result.errors)), err=True)
@@ -0,0 +1,35 @@
+"""trigram indexes for question search
+
+Revision ID: 157df4195876
+Revises:
+Create Date: 2026-10-18 02:58:12.403219
+
+The tables themselves come from trivia.psql or db.create_all(), which
+setup_db() runs before any migration.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '157df4195876'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # gin_trgm_ops indexes serve ILIKE '%term%' on both columns; sqlite has
+    # no equivalent and keeps scanning
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_questions_question_trgm', 'questions', ['question'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'question': 'gin_trgm_ops'})
+        op.create_index('ix_questions_answer_trgm', 'questions', ['answer'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'answer': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_questions_answer_trgm', table_name='questions')
+        op.drop_index('ix_questions_question_trgm', table_name='questions')
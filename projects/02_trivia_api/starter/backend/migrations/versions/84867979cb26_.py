@@ -0,0 +1,96 @@
+"""integer foreign key and (category, id) index for questions.category
+
+Revision ID: 84867979cb26
+Revises: 157df4195876
+Create Date: 2026-10-18 03:14:40.118362
+
+Text categories that are not a number, and ids of categories that no longer
+exist, become NULL; downgrade() cannot bring them back.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '84867979cb26'
+down_revision = '157df4195876'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEY = 'questions_category_fkey'
+INDEX = 'ix_questions_category_id'
+
+
+def column_type(inspector, table, name):
+    return next(column['type'] for column in inspector.get_columns(table)
+                if column['name'] == name)
+
+
+def upgrade():
+    # sqlite databases are only made by db.create_all(), from the current models
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+
+    if not isinstance(column_type(inspector, 'questions', 'category'), sa.Integer):
+        # categories were saved as text; anything that is not an id is dropped
+        op.alter_column('questions', 'category',
+                   existing_type=sa.String(),
+                   type_=sa.Integer(),
+                   existing_nullable=True,
+                   postgresql_using="CASE WHEN category ~ '^[0-9]+$' THEN category::integer END")
+    op.execute('UPDATE questions SET category = NULL '
+               'WHERE category NOT IN (SELECT id FROM categories)')
+
+    # trivia.psql databases already have an integer column with a foreign
+    # key named "category"; only what is missing is added
+    if not any(fk['referred_table'] == 'categories' for fk in inspector.get_foreign_keys('questions')):
+        op.create_foreign_key(FOREIGN_KEY, 'questions', 'categories',
+                              ['category'], ['id'], ondelete='SET NULL')
+    if not any(index['name'] == INDEX for index in inspector.get_indexes('questions')):
+        op.create_index(INDEX, 'questions', ['category', 'id'], unique=False)
+
+    # question_counts is keyed by the category id now, with 0 for none
+    if 'question_counts' in inspector.get_table_names():
+        op.execute('DELETE FROM question_counts')
+        if not isinstance(column_type(inspector, 'question_counts', 'category'), sa.Integer):
+            op.alter_column('question_counts', 'category',
+                       existing_type=sa.String(),
+                       type_=sa.Integer(),
+                       existing_nullable=False,
+                       postgresql_using='category::integer')
+        op.execute('INSERT INTO question_counts (category, total) '
+                   'SELECT coalesce(category, 0), count(*) FROM questions '
+                   'GROUP BY coalesce(category, 0)')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+
+    if any(index['name'] == INDEX for index in inspector.get_indexes('questions')):
+        op.drop_index(INDEX, table_name='questions')
+    foreign_keys = [fk['name'] for fk in inspector.get_foreign_keys('questions')
+                    if fk['referred_table'] == 'categories']
+    if FOREIGN_KEY in foreign_keys:
+        op.drop_constraint(FOREIGN_KEY, 'questions', type_='foreignkey')
+        foreign_keys.remove(FOREIGN_KEY)
+    # a foreign key upgrade() did not make means the column was an integer
+    # before, as in trivia.psql
+    if not foreign_keys and isinstance(column_type(inspector, 'questions', 'category'), sa.Integer):
+        op.alter_column('questions', 'category',
+                   existing_type=sa.Integer(),
+                   type_=sa.String(),
+                   existing_nullable=True,
+                   postgresql_using='category::text')
+
+    if ('question_counts' in inspector.get_table_names() and
+            isinstance(column_type(inspector, 'question_counts', 'category'), sa.Integer)):
+        op.alter_column('question_counts', 'category',
+                   existing_type=sa.Integer(),
+                   type_=sa.String(),
+                   existing_nullable=False,
+                   postgresql_using="CASE WHEN category = 0 THEN '' ELSE category::text END")
@@ -1,6 +1,12 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
-from flask_sqlalchemy import SQLAlchemy
+import hashlib
+import threading
+import time
+from itertools import chain
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, \
+    create_engine, event, func, inspect, select, text
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from flask_migrate import Migrate
 import json
 
 database_name = "trivia"
@@ -8,6 +14,7 @@ database_path = "postgres://{}:{}@{}/{}".format(
     'postgres', '1234', 'localhost:5432', database_name)
 
 db = SQLAlchemy()
+migrate = Migrate()
 
 '''
 setup_db(app)
@@ -20,7 +27,12 @@ def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
+    migrate.init_app(app, db)
     db.create_all()
+    category_cache.invalidate()
+    # databases restored from trivia.psql start with an empty counter table
+    if QuestionCount.query.first() is None:
+        QuestionCount.rebuild()
 
 
 '''
@@ -31,11 +43,16 @@ Question
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    # category listings and quiz picks page through (category, id) ranges
+    __table_args__ = (
+        Index('ix_questions_category_id', 'category', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(
+        Integer, ForeignKey('categories.id', ondelete='SET NULL'))
     difficulty = Column(Integer)
 
     def __init__(self, question, answer, category, difficulty):
@@ -65,6 +82,76 @@ class Question(db.Model):
         }
 
 
+'''
+QuestionCount
+
+'''
+
+
+class QuestionCount(db.Model):
+    '''
+    Number of questions per category, kept up to date by the Question
+    mapper events below so totals never scan the questions table. Category
+    0 counts questions without one.
+    '''
+    __tablename__ = 'question_counts'
+
+    category = Column(Integer, primary_key=True, autoincrement=False)
+    total = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def total_for(cls, category=None):
+        '''Questions in category, or in all categories when it is None.'''
+        query = db.session.query(func.coalesce(func.sum(cls.total), 0))
+        if category is not None:
+            query = query.filter(cls.category == int(category))
+        return query.scalar()
+
+    @classmethod
+    def rebuild(cls):
+        '''Recounts every category, e.g. after rows were bulk loaded.'''
+        category = func.coalesce(Question.category, 0)
+        db.session.query(cls).delete()
+        db.session.execute(cls.__table__.insert().from_select(
+            ['category', 'total'],
+            select([category, func.count(Question.id)]).group_by(category)))
+        db.session.commit()
+
+
+# PostgreSQL and SQLite (3.24+) share this upsert syntax
+COUNT_QUESTIONS = text(
+    'INSERT INTO question_counts (category, total) VALUES (:category, :delta) '
+    'ON CONFLICT (category) '
+    'DO UPDATE SET total = question_counts.total + excluded.total')
+
+
+def count_questions(connection, category, delta):
+    # runs in the flush's transaction, so the count commits with the rows
+    connection.execute(COUNT_QUESTIONS,
+                       category=0 if category is None else int(category),
+                       delta=delta)
+
+
+@event.listens_for(Question, 'after_insert')
+def count_inserted_question(mapper, connection, target):
+    count_questions(connection, target.category, 1)
+
+
+@event.listens_for(Question, 'after_delete')
+def count_deleted_question(mapper, connection, target):
+    count_questions(connection, target.category, -1)
+
+
+@event.listens_for(Question, 'after_update')
+def count_moved_question(mapper, connection, target):
+    history = inspect(target).attrs.category.history
+    if history.has_changes():
+        for category in history.deleted:
+            count_questions(connection, category, -1)
+        for category in history.added:
+            count_questions(connection, category, 1)
+
+
 '''
 Category
 
@@ -84,3 +171,64 @@ class Category(db.Model):
         return {
             self.id: self.type
         }
+
+
+'''
+CategoryCache
+
+'''
+
+
+class CategoryCache:
+    '''
+    Process-local copy of the {id: type} category map. Committed category
+    writes made through this process invalidate it; max_age bounds how long
+    writes made by other processes go unnoticed. The ETag is a hash of the
+    map, so every process serves the same ETag for the same categories.
+    '''
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.categories = None
+        self.etag = None
+        self.loaded_at = 0
+
+    def get(self):
+        '''Returns (categories, etag); treat categories as read-only.'''
+        with self.lock:
+            if (self.categories is None or
+                    time.monotonic() - self.loaded_at > self.max_age):
+                self.categories = {
+                    category.id: category.type
+                    for category in Category.query.order_by(Category.id)}
+                self.etag = hashlib.sha1(json.dumps(
+                    self.categories, sort_keys=True).encode()).hexdigest()
+                self.loaded_at = time.monotonic()
+            return self.categories, self.etag
+
+    def invalidate(self):
+        with self.lock:
+            self.categories = None
+
+
+category_cache = CategoryCache()
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def note_category_writes(session, flush_context):
+    # still the pre-flush state here
+    if any(isinstance(instance, Category) for instance in
+           chain(session.new, session.dirty, session.deleted)):
+        session.info['categories_changed'] = True
+
+
+@event.listens_for(SignallingSession, 'after_commit')
+def invalidate_categories(session):
+    if session.info.pop('categories_changed', False):
+        category_cache.invalidate()
+
+
+@event.listens_for(SignallingSession, 'after_soft_rollback')
+def forget_category_writes(session, previous_transaction):
+    session.info.pop('categories_changed', None)
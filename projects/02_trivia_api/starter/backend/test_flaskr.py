@@ -1,23 +1,113 @@
 import os
+import re
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, text
 
 from flaskr.app import create_app
-from models import setup_db, Question, Category
+from models import db, Question, Category, QuestionCount, category_cache
+
+# TRIVIA_TEST_DATABASE_URL=sqlite:// runs the suite on an in-memory SQLite
+# database instead, one per process under pytest-xdist
+database_path = os.environ.get(
+    'TRIVIA_TEST_DATABASE_URL', "postgres://{}:{}@{}/{}".format(
+        'postgres', '1234', 'localhost:5432', 'trivia_test'))
+fixtures_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+COPY_BLOCK = re.compile(r'COPY public\.(\w+) \((.*)\) FROM stdin;')
+
+app = None
+
+
+def read_fixtures(path=fixtures_path):
+    """Rows of the COPY blocks of a pg_dump file, as {table: [row]}."""
+    fixtures = {}
+    with open(path) as dump:
+        for line in dump:
+            match = COPY_BLOCK.match(line)
+            if match is None:
+                continue
+            columns = match.group(2).split(', ')
+            rows = fixtures[match.group(1)] = []
+            for line in dump:
+                if line.startswith('\\.'):
+                    break
+                values = line.rstrip('\n').split('\t')
+                rows.append(dict(zip(columns, [
+                    None if value == '\\N' else value for value in values])))
+    return fixtures
+
+
+def load_fixtures():
+    """Bulk inserts the trivia.psql rows into the tables that are empty."""
+    postgres = db.engine.dialect.name == 'postgresql'
+    if postgres:
+        # parallel test processes sharing a database load it only once
+        db.session.execute(text('SELECT pg_advisory_xact_lock(4242)'))
+    fixtures = read_fixtures()
+    for model in (Category, Question):
+        table = model.__table__
+        if db.session.query(model).first() is not None:
+            continue
+        db.session.execute(table.insert(), [
+            {column: table.c[column].type.python_type(value)
+             for column, value in row.items() if value is not None}
+            for row in fixtures[table.name]])
+        if postgres:
+            db.session.execute(text(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "(SELECT max(id) FROM {0}))".format(table.name)))
+    db.session.commit()
+    QuestionCount.rebuild()
+
+
+def setUpModule():
+    """Builds the app, its schema and fixtures once for all the tests."""
+    global app
+    app = create_app({'DATABASE_URL': database_path, 'TESTING': True})
+    with app.app_context():
+        load_fixtures()
+        if db.engine.dialect.name == 'sqlite':
+            # pysqlite only begins a transaction before writing, which
+            # would make the first SAVEPOINT the outer transaction
+            event.listen(db.engine, 'begin',
+                         lambda connection: connection.execute('BEGIN'))
+
+
+def begin_savepoint(session, transaction, connection):
+    # sessions of a test work inside a SAVEPOINT of the test's
+    # transaction, so the commits of the code under test only release it
+    if not transaction.nested:
+        session.begin_nested()
+
+
+def restart_savepoint(session, transaction):
+    if (transaction.nested and not transaction._parent.nested and
+            session.transaction is transaction._parent):
+        session.begin_nested()
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
     def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
+        """Run the test in a transaction that tearDown rolls back."""
+        self.app = app
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}:{}@{}/{}".format(
-            'postgres', '1234', 'localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
+        self.context = self.app.app_context()
+        self.context.push()
+
+        self.connection = db.engine.connect()
+        if db.engine.dialect.name == 'sqlite':
+            self.connection.connection.isolation_level = None
+        self.transaction = self.connection.begin()
+        self.session = db.session
+        db.session = db.create_scoped_session(
+            options={'bind': self.connection, 'binds': {}})
+        event.listen(db.session, 'after_begin', begin_savepoint)
+        event.listen(db.session, 'after_transaction_end', restart_savepoint)
+        self.db = db
 
         self.new_question = {
             'question': 'How are you ?',
@@ -25,16 +115,17 @@ class TriviaTestCase(unittest.TestCase):
             'category': '1',
             'difficulty': 1}
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-
     def tearDown(self):
         """Executed after reach test"""
-        pass
+        event.remove(db.session, 'after_transaction_end', restart_savepoint)
+        db.session.rollback()
+        db.session.remove()
+        db.session = self.session
+        self.transaction.rollback()
+        self.connection.close()
+        self.context.pop()
+        # the category cache may hold categories the test rolled back
+        category_cache.invalidate()
 
     def test_get_categories(self):
         res = self.client().get('/categories')
@@ -44,6 +135,32 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['categories'])
 
+    def test_get_categories_not_modified(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+
+        res = self.client().get(
+            '/categories', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+    def test_get_categories_etag_changes_with_categories(self):
+        etag = self.client().get('/categories').headers['ETag']
+
+        with self.app.app_context():
+            category = Category(type='Music')
+            self.db.session.add(category)
+            self.db.session.commit()
+            res = self.client().get('/categories')
+            self.db.session.delete(category)
+            self.db.session.commit()
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertIn('Music', data['categories'].values())
+
     def test_get_questions(self):
         res = self.client().get('/questions/')
         data = json.loads(res.data)
@@ -54,6 +171,68 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_questions'])
         self.assertTrue(data['categories'])
 
+    def test_get_questions_after_cursor(self):
+        first_page = json.loads(self.client().get('/questions/').data)
+        second_page = json.loads(
+            self.client().get('/questions/?page=2').data)
+        last_id = first_page['questions'][-1]['id']
+
+        res = self.client().get('/questions/?after={}'.format(last_id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['questions'], second_page['questions'])
+
+    def test_get_questions_per_page(self):
+        first_pages = json.loads(
+            self.client().get('/questions/?per_page=20').data)
+        res = self.client().get('/questions/?per_page=5&page=2')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(first_pages['questions']),
+                         min(first_pages['total_questions'], 20))
+        self.assertEqual(data['questions'], first_pages['questions'][5:10])
+
+    def test_get_questions_fields(self):
+        res = self.client().get('/categories/1/questions?fields=id,answer')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'][0], {
+            'id': 20, 'answer': 'The Liver'})
+
+    def test_get_questions_unknown_field(self):
+        res = self.client().get('/questions/?fields=id,password')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_get_all_questions_streamed(self):
+        res = self.client().get('/questions/?all=true')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['categories'])
+        self.assertEqual(len(data['questions']), data['total_questions'])
+        self.assertEqual(
+            [question['id'] for question in data['questions']],
+            sorted(question['id'] for question in data['questions']))
+
+    def test_get_all_category_questions_as_ndjson(self):
+        res = self.client().get(
+            '/categories/1/questions?all=true',
+            headers={'Accept': 'application/x-ndjson'})
+        questions = [json.loads(line) for line in res.data.splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(
+            [question['id'] for question in questions], [20, 21, 22])
+
     def test_404_errorhandler_if_page_does_not_exist(self):
         res = self.client().get('/questions/?page=10000')
         data = json.loads(res.data)
@@ -103,6 +282,78 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
 
+    def test_total_questions_follow_add_and_delete(self):
+        def totals():
+            return (
+                json.loads(self.client().get(
+                    '/questions/').data)['total_questions'],
+                json.loads(self.client().get(
+                    '/categories/1/questions').data)['total_questions'])
+
+        total, science_total = totals()
+        self.assertEqual(science_total, 3)
+
+        res = self.client().post('/questions', json=self.new_question)
+        created_id = json.loads(res.data)['created_id']
+        self.assertEqual(totals(), (total + 1, science_total + 1))
+
+        self.client().delete('/questions/' + str(created_id))
+        self.assertEqual(totals(), (total, science_total))
+
+    def test_add_question_with_invalid_category(self):
+        res = self.client().post(
+            '/questions', json=dict(self.new_question, category='Science'))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_add_questions_bulk(self):
+        science_total = json.loads(self.client().get(
+            '/categories/1/questions').data)['total_questions']
+        rows = [
+            dict(self.new_question, question='Bulk question one ?'),
+            dict(self.new_question, question='Bulk question two ?'),
+            dict(self.new_question, question=''),
+            dict(self.new_question, question='Bulk question ?',
+                 category=1000)]
+
+        res = self.client().post(
+            '/questions/bulk?chunk_size=2',
+            data='\n'.join(json.dumps(row) for row in rows) + '\nnot json',
+            content_type='application/x-ndjson')
+        data = json.loads(res.data)
+        added = json.loads(self.client().get(
+            '/categories/1/questions?page=1000').data)
+        created = Question.query.filter(
+            Question.question.startswith('Bulk question')).count()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['inserted'], 2)
+        self.assertEqual(data['rejected'], 3)
+        self.assertEqual(
+            [error['line'] for error in data['errors']], [3, 4, 5])
+        self.assertEqual(added['total_questions'], science_total + 2)
+        self.assertEqual(created, 2)
+
+    def test_add_questions_bulk_csv(self):
+        res = self.client().post(
+            '/questions/bulk',
+            data='question,answer,category,difficulty\n'
+                 'Bulk csv question ?,yes,1,2\n'
+                 'Bulk csv question ?,yes,1,hard\n',
+            content_type='text/csv')
+        data = json.loads(res.data)
+        created = Question.query.filter_by(
+            question='Bulk csv question ?').one()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['errors'], [
+            {'line': 3, 'error': 'difficulty must be an integer'}])
+        self.assertEqual(created.difficulty, 2)
+
     def test_search_exist_term(self):
         res = self.client().post('/search', json={'searchTerm': "what"})
         data = json.loads(res.data)
@@ -112,6 +363,14 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['questions'])
         self.assertTrue(data['total_questions'])
 
+    def test_search_matches_answers(self):
+        res = self.client().post('/search', json={'searchTerm': "angelou"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(data['questions'][0]['answer'], 'Maya Angelou')
+
     def test_search_not_exist_term(self):
         res = self.client().post('/search', json={'searchTerm': "##"})
         data = json.loads(res.data)
@@ -130,6 +389,8 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['questions'])
         self.assertTrue(data['total_questions'])
         self.assertEqual(data['current_category'], 1)
+        self.assertTrue(all(
+            question['category'] == 1 for question in data['questions']))
 
     def test_get_questions_by_not_exist_category(self):
         res = self.client().get('/categories/1000/questions')
@@ -155,6 +416,24 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['question'])
 
+    def test_get_question_for_quiz_never_repeats(self):
+        previous_questions = []
+        for _ in range(3):
+            res = self.client().post(
+                '/quizzes',
+                json={
+                    'previous_questions': previous_questions,
+                    'quiz_category': {
+                        'type': 'Science',
+                        'id': '1'}})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn(data['question']['id'], previous_questions)
+            previous_questions.append(data['question']['id'])
+
+        self.assertEqual(sorted(previous_questions), [20, 21, 22])
+
     def test_get_question_for_quiz_after_solving_all_questions(self):
         res = self.client().post(
             '/quizzes',
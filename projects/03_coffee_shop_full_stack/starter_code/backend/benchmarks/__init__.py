@@ -0,0 +1,47 @@
+'''
+Helpers shared by the benchmarks, run from the backend directory with
+python -m benchmarks.<name>.
+'''
+import base64
+import json
+import os
+import tempfile
+import time
+
+from Crypto.PublicKey import RSA
+from jose import jwt
+
+from src.auth import auth
+from src.auth.jwks import JWKSKeyStore
+
+
+def b64(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def signed_token(permissions):
+    '''A valid token, after pointing auth at the JWKS of its key.'''
+    key = RSA.generate(2048)
+    path = os.path.join(tempfile.mkdtemp(), 'jwks.json')
+    with open(path, 'w') as f:
+        json.dump({'keys': [{
+            'kty': 'RSA', 'kid': 'bench', 'use': 'sig', 'alg': 'RS256',
+            'n': b64(key.n), 'e': b64(key.e)}]}, f)
+    auth.jwks = JWKSKeyStore('file://' + path)
+
+    return jwt.encode({
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'exp': int(time.time()) + 3600,
+        'permissions': permissions
+    }, key.export_key().decode(), algorithm='RS256',
+        headers={'kid': 'bench'})
+
+
+def per_call(fn, calls):
+    '''Mean wall time of fn() in microseconds.'''
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
@@ -0,0 +1,67 @@
+'''
+Cost of the requires_auth hot path.
+
+    python -m benchmarks.bench_auth [calls]
+
+Tokens are signed with a throwaway RSA key whose JWKS is served from a
+temporary file:// URL, so no Auth0 tenant is needed and the JWKS round trip
+of the original code is not part of the numbers.
+
+  verify      verify_decode_jwt() + check_permissions(), what every request
+              paid before verified tokens were cached
+  cached      a @requires_auth view called with a token already verified
+  any-of      the same with requires_auth(..., any_of=True)
+  list scan   `permission in payload['permissions']` on a token with many
+              permissions, the old check
+  set check   check_permission_set() on the same token
+'''
+import sys
+
+from flask import Flask
+
+from benchmarks import signed_token, per_call
+from src.auth import auth
+
+# a manager token from a tenant with many fine grained permissions
+PERMISSIONS = ['read:report-%d' % i for i in range(60)] + [
+    'get:drinks-detail', 'post:drinks', 'patch:drinks', 'delete:drinks']
+
+
+def main(calls):
+    token = signed_token(PERMISSIONS)
+    app = Flask(__name__)
+
+    @auth.requires_auth('delete:drinks')
+    def view():
+        return 'ok'
+
+    @auth.requires_auth('post:drinks', 'delete:drinks', any_of=True)
+    def any_of_view():
+        return 'ok'
+
+    def verify():
+        payload = auth.verify_decode_jwt(token)
+        auth.check_permissions('delete:drinks', payload)
+
+    payload = auth.verify_decode_jwt(token)
+    granted = auth.permission_set(payload)
+    required = frozenset(['delete:drinks'])
+
+    headers = {'Authorization': 'Bearer ' + token}
+    with app.test_request_context('/drinks', headers=headers):
+        view()
+        results = [
+            ('verify', per_call(verify, max(calls // 100, 10))),
+            ('cached', per_call(view, calls)),
+            ('any-of', per_call(any_of_view, calls)),
+            ('list scan', per_call(
+                lambda: 'delete:drinks' in payload['permissions'], calls)),
+            ('set check', per_call(
+                lambda: auth.check_permission_set(required, granted), calls)),
+        ]
+    for name, micros in results:
+        print('%10s  %10.2f us' % (name, micros))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,93 @@
+'''
+Requests per second of GET /drinks and GET /drinks-detail.
+
+    python -m benchmarks.bench_menu [drinks] [requests]
+
+The app runs on a temporary sqlite database seeded with `drinks` drinks and
+is called through the Flask test client, so the numbers are those of a
+single worker without network. "uncached" is the handler before the menu
+snapshot: query, serialize and jsonify on every request. "snapshot" serves
+the encoded bytes and "304" sends the snapshot's ETag back.
+'''
+import os
+import sys
+import tempfile
+import time
+
+from flask import jsonify
+
+from benchmarks import signed_token
+from src.api import app
+from src.auth.auth import requires_auth
+from src.database.models import db, db_drop_and_create_all, Drink
+
+COLORS = ['brown', 'white', 'black', 'green', 'blue']
+
+
+def seed(count):
+    db_drop_and_create_all()
+    db.session.add_all(
+        Drink(title='Drink %d' % i, recipe=[
+            {'name': 'Part %d' % j, 'color': COLORS[(i + j) % len(COLORS)],
+             'parts': j + 1}
+            for j in range(i % 4 + 1)])
+        for i in range(count))
+    db.session.commit()
+
+
+@app.route('/bench/drinks-uncached')
+@requires_auth('get:drinks')
+def uncached_drinks():
+    drinks = Drink.query.order_by(Drink.id).all()
+    return jsonify({
+        "success": True,
+        "drinks": [drink.short() for drink in drinks]
+    })
+
+
+@app.route('/bench/drinks-detail-uncached')
+@requires_auth('get:drinks-detail')
+def uncached_drinks_detail():
+    drinks = Drink.query.order_by(Drink.id).all()
+    return jsonify({
+        "success": True,
+        "drinks": [drink.long() for drink in drinks]
+    })
+
+
+def requests_per_second(client, path, headers, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get(path, headers=headers)
+    elapsed = time.perf_counter() - start
+    assert response.status_code in (200, 304), response.status_code
+    return count / elapsed
+
+
+def main(drinks, count):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    token = signed_token(['get:drinks', 'get:drinks-detail'])
+    headers = {'Authorization': 'Bearer ' + token}
+    client = app.test_client()
+    with app.app_context():
+        seed(drinks)
+
+    print('%d drinks, %d requests' % (drinks, count))
+    print('%14s  %10s  %10s  %10s' % ('', 'uncached', 'snapshot', '304'))
+    for name, uncached in [('/drinks', '/bench/drinks-uncached'),
+                           ('/drinks-detail',
+                            '/bench/drinks-detail-uncached')]:
+        etag = client.get(name, headers=headers).headers['ETag']
+        print('%14s  %10.0f  %10.0f  %10.0f' % (
+            name,
+            requests_per_second(client, uncached, headers, count),
+            requests_per_second(client, name, headers, count),
+            requests_per_second(
+                client, name, dict(headers, **{'If-None-Match': etag}),
+                count)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
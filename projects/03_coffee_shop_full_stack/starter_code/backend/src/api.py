@@ -1,16 +1,18 @@
 import os
 from flask import Flask, request, jsonify, abort
 from sqlalchemy import exc
-import json
 from flask_cors import CORS
 
 from .database.models import db_drop_and_create_all, setup_db, Drink
 from .auth.auth import AuthError, requires_auth
+from .menu import MenuSnapshot
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
 
+menu = MenuSnapshot()
+
 @app.after_request
 def after_request(response):
     response.headers.add(
@@ -38,13 +40,9 @@ def after_request(response):
 @app.route('/drinks')
 @requires_auth('get:drinks')
 def get_drinks():
-    
-    drinks = Drink.query.order_by(Drink.id).all()
 
-    return jsonify({
-        "success": True,
-        "drinks": [drink.short() for drink in drinks]
-    })
+    # encoded once per change to the drinks, see MenuSnapshot
+    return menu.response('short', request)
 
 
 
@@ -59,13 +57,8 @@ def get_drinks():
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
 def get_drinks_detail():
-    
-    drinks = Drink.query.order_by(Drink.id).all()
 
-    return jsonify({
-        "success": True,
-        "drinks": [drink.long() for drink in drinks]
-    })
+    return menu.response('long', request)
 
 
 '''
@@ -86,8 +79,9 @@ def create_drinks():
         title = request.get_json()['title']
         recipe = request.get_json()['recipe']
 
-        drink = Drink(title=title, recipe=json.dumps(recipe))
+        drink = Drink(title=title, recipe=recipe)
         drink.insert()
+        menu.invalidate()
 
         return jsonify({
             "success": True,
@@ -122,8 +116,9 @@ def edit_drinks(id):
         if "title" in request.get_json():
             drink.title = request.get_json()['title']
         if "recipe" in request.get_json():
-            drink.recipe = json.dumps(request.get_json()['recipe'])
+            drink.recipe = request.get_json()['recipe']
         drink.update()
+        menu.invalidate()
 
         return jsonify({
             "success": True,
@@ -155,6 +150,7 @@ def delete_drinks(id):
             abort(404)
 
         drink.delete()
+        menu.invalidate()
 
         return jsonify({
             "success": True,
@@ -1,13 +1,21 @@
-import json
+import os
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from .jwks import JWKSKeyStore
+from .tokens import TokenCache
 
 
 AUTH0_DOMAIN = 'coffshop.us.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffee'
+# AUTH0_JWKS_URL can point tests at a file:// key set or a stub server
+JWKS_URL = os.environ.get(
+    'AUTH0_JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+jwks = JWKSKeyStore(JWKS_URL)
+verified_tokens = TokenCache()
 
 ## AuthError Exception
 '''
@@ -20,6 +28,18 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+# raised on every request without the right permissions, so built once;
+# treat them as read-only
+PERMISSIONS_MISSING = {
+    'code': 'invalid_claims',
+    'description': 'Permissions not included in JWT.'
+}
+PERMISSION_NOT_FOUND = {
+    'code': 'unauthorized',
+    'description': 'Permission not found.'
+}
+
+
 ## Auth Header
 
 '''
@@ -74,17 +94,38 @@ def get_token_auth_header():
     return true otherwise
 '''
 def check_permissions(permission, payload):
+    return check_permission_set(
+        frozenset([permission]), permission_set(payload))
+
+'''
+permission_set(payload)
+    the permissions claim of a decoded jwt payload as a frozenset, or None
+    when the payload has none; computed once per token, see requires_auth
+'''
+def permission_set(payload):
     if 'permissions' not in payload:
-        raise AuthError({
-            'code': 'invalid_claims',
-            'description': 'Permissions not included in JWT.'
-        }, 400)
+        return None
+    return frozenset(payload['permissions'])
 
-    if permission not in payload['permissions']:
-        raise AuthError({
-            'code': 'unauthorized',
-            'description': 'Permission not found.'
-        }, 403)
+'''
+check_permission_set(required, granted, any_of=False)
+    @INPUTS
+        required: frozenset of permission strings
+        granted: the permission_set() of the payload
+
+    raises an AuthError unless granted holds all of the required
+    permissions, or with any_of at least one of them
+'''
+def check_permission_set(required, granted, any_of=False):
+    if granted is None:
+        raise AuthError(PERMISSIONS_MISSING, 400)
+
+    if any_of:
+        allowed = not required.isdisjoint(granted)
+    else:
+        allowed = required <= granted
+    if not allowed:
+        raise AuthError(PERMISSION_NOT_FOUND, 403)
     return True
 
 '''
@@ -101,25 +142,15 @@ def check_permissions(permission, payload):
     !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
 '''
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    # the key set is cached, see JWKSKeyStore
+    rsa_key = jwks.get(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -153,23 +184,43 @@ def verify_decode_jwt(token):
                 'description': 'Unable to find the appropriate key.'
             }, 400)
 
+'''
+verify_token(token)
+    returns the decoded payload of token and its permission_set(), from
+    verified_tokens when the token was verified before, see TokenCache
+'''
+def verify_token(token):
+    verified = verified_tokens.get(token)
+    if verified is None:
+        payload = verify_decode_jwt(token)
+        verified = (payload, permission_set(payload))
+        verified_tokens.set(token, verified, payload.get('exp'))
+    return verified
+
 '''
 @TODO implement @requires_auth(permission) decorator method
     @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permission: string permission (i.e. 'post:drink'); several
+            permissions are all required, or with any_of=True any one of
+            them (i.e. requires_auth('patch:drinks', 'post:drinks',
+            any_of=True)); at least one is needed
 
     it should use the get_token_auth_header method to get the token
     it should use the verify_decode_jwt method to decode the jwt
     it should use the check_permissions method validate claims and check the requested permission
     return the decorator which passes the decoded payload to the decorated method
 '''
-def requires_auth(permission=''):
+def requires_auth(*permissions, any_of=False):
+    if not permissions:
+        raise TypeError('requires_auth() needs at least one permission')
+    required = frozenset(permissions)
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            payload, granted = verify_token(token)
+            check_permission_set(required, granted, any_of)
             return f(*args, **kwargs)
 
         return wrapper
@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+
+'''
+JWKSKeyStore
+In-process cache of the signing keys published at a JWKS URL, indexed by
+key id (kid). Any URL urlopen understands works, so tests can use a
+file:// URL or a local stub server.
+
+    - keys younger than max_age are served from memory
+    - older keys keep being served while one background thread refetches
+      them (stale-while-revalidate); past max_age + stale_age they are
+      refetched before answering; failed refetches are retried at most
+      every min_refetch_interval seconds
+    - a kid that is not in the set (Auth0 rotated its keys) triggers one
+      refetch, at most every min_refetch_interval seconds so tokens with
+      made up kids can't hammer the JWKS endpoint
+    - concurrent refetches are collapsed into one (single flight), and a
+      failed refetch keeps serving the keys already known
+'''
+class JWKSKeyStore:
+    def __init__(self, url, max_age=600, stale_age=3600,
+                 min_refetch_interval=30, timeout=5):
+        self.url = url
+        self.max_age = max_age
+        self.stale_age = stale_age
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self.keys = {}
+        self.fetched_at = None
+        self.attempted_at = None
+        self.fetch_lock = threading.Lock()
+        self.refreshing = False
+
+    '''
+    get(kid)
+        returns the RSA key with the given kid, or None if the JWKS has none
+    '''
+    def get(self, kid):
+        age = self.age()
+        if age is None:
+            self.refresh(raise_errors=True)
+        elif age > self.max_age and self.can_refetch():
+            if age > self.max_age + self.stale_age:
+                self.refresh(self.fetched_at)
+            else:
+                self.refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and self.can_refetch():
+            self.refresh(self.fetched_at)
+            key = self.keys.get(kid)
+        return key
+
+    def age(self):
+        if self.fetched_at is None:
+            return None
+        return time.monotonic() - self.fetched_at
+
+    def can_refetch(self):
+        return (self.attempted_at is None or
+                time.monotonic() - self.attempted_at >
+                self.min_refetch_interval)
+
+    '''
+    refresh(seen)
+        refetches the key set unless another thread already replaced the
+        one fetched at seen while this one waited for the lock
+    '''
+    def refresh(self, seen=None, raise_errors=False):
+        with self.fetch_lock:
+            if self.fetched_at != seen:
+                return
+            self.attempted_at = time.monotonic()
+            try:
+                self.keys = self.fetch()
+                self.fetched_at = time.monotonic()
+            except Exception:
+                if raise_errors:
+                    raise
+
+    def refresh_in_background(self):
+        with self.fetch_lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                self.refresh(self.fetched_at)
+            finally:
+                self.refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+        return {
+            key['kid']: {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+            for key in jwks['keys']
+        }
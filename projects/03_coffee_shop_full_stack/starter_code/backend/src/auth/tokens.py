@@ -0,0 +1,53 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+'''
+TokenCache
+Bounded LRU of what was derived from tokens whose signature and claims
+were already verified, keyed by the SHA-256 of the token so the cache
+never holds usable bearer tokens. An entry expires with its token's exp
+claim, and after max_ttl seconds at the latest so tokens signed with a key
+that was since rotated out stop being accepted within max_ttl.
+'''
+class TokenCache:
+    def __init__(self, maxsize=1024, max_ttl=300):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    '''
+    get(token)
+        returns the value cached for token, or None when it has to be
+        verified
+    '''
+    def get(self, token):
+        key = hashlib.sha256(token.encode()).digest()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if time.time() >= expires:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    '''
+    set(token, value, exp)
+        caches value for token until exp, the token's expiry timestamp
+    '''
+    def set(self, token, value, exp=None):
+        expires = time.time() + self.max_ttl
+        if exp is not None:
+            expires = min(expires, exp)
+        key = hashlib.sha256(token.encode()).digest()
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -38,21 +39,34 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients, parsed once when the row is loaded
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    recipe = Column(JSON, nullable=False)
+    # the color and parts of every ingredient, what short() shows;
+    # kept in step with recipe when it is set
+    short_recipe = Column(JSON, nullable=False)
+
+    '''
+    validates recipe
+        a single ingredient may be given on its own instead of in a list
+        raises KeyError or TypeError when an ingredient lacks color or parts
+    '''
+    @validates('recipe')
+    def validate_recipe(self, key, recipe):
+        if isinstance(recipe, dict):
+            recipe = [recipe]
+        self.short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in recipe]
+        return recipe
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': self.short_recipe
         }
 
     '''
@@ -63,7 +77,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
     '''
@@ -74,6 +88,7 @@ class Drink(db.Model):
         EXAMPLE
             drink = Drink(title=req_title, recipe=req_recipe)
             drink.insert()
+        recipe is the list of ingredients itself, not a json string
     '''
     def insert(self):
         db.session.add(self)
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import threading
+import time
+
+from flask import Response
+from sqlalchemy.orm import load_only
+
+from .database.models import Drink
+
+
+'''
+MenuSnapshot
+The GET /drinks and GET /drinks-detail responses, encoded once and served
+as bytes until a drink is created, edited or deleted (invalidate()). Every
+snapshot carries a strong ETag, the hash of its bytes, so clients that
+send it back in If-None-Match get a 304 without a body.
+
+The snapshot is per process: max_age bounds how long writes made through
+other processes go unnoticed.
+'''
+class MenuSnapshot:
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.version = 0
+        self.snapshots = {}
+
+    '''
+    response(form, request)
+        the drinks in their short() or long() form as a response to request
+    '''
+    def response(self, form, request):
+        body, etag = self.get(form)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    def get(self, form):
+        with self.lock:
+            version = self.version
+            snapshot = self.snapshots.get(form)
+        if snapshot is not None and \
+                time.monotonic() - snapshot[2] <= self.max_age:
+            return snapshot[0], snapshot[1]
+
+        body = self.encode(form)
+        etag = hashlib.sha256(body).hexdigest()
+        with self.lock:
+            # a write committed while encoding makes this one outdated
+            if self.version == version:
+                self.snapshots[form] = (body, etag, time.monotonic())
+        return body, etag
+
+    def encode(self, form):
+        query = Drink.query.order_by(Drink.id)
+        if form == 'short':
+            # short() needs neither the full recipe nor its parsing
+            query = query.options(load_only('id', 'title', 'short_recipe'))
+        drinks = [getattr(drink, form)() for drink in query]
+        return json.dumps({
+            "success": True,
+            "drinks": drinks
+        }).encode()
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.snapshots.clear()